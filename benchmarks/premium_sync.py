@@ -0,0 +1,394 @@
+"""
+Offline benchmarks for the premium sync code in exts/realms_premium_watch.py.
+
+Runs Tortoise on an in-memory SQLite database with synthetic codes, guild configs
+and a fake premium role, with Discord's REST API and Redis stubbed out.
+
+Usage: python -m benchmarks.premium_sync --members 10000 100000 500000
+"""
+import argparse
+import asyncio
+import contextlib
+import datetime
+import logging
+import random
+import time
+import tracemalloc
+import typing
+
+from tortoise import Tortoise
+
+import common.models as models
+import common.premium_sync as premium_sync
+import common.role_queue as role_queue
+from exts.realms_premium_watch import RealmsPremiumWatch
+
+PREMIUM_ROLE_ID = 1007868499772846081
+SUPPORTER_ROLE_ID = 987447832715857961
+GUILD_ID = 775912554928144384
+OWNER_ID = 229350299909881876
+
+
+class QueryCounter(logging.Handler):
+    # tortoise logs every query it runs to this logger at the debug level
+    def __init__(self) -> None:
+        super().__init__(logging.DEBUG)
+        self.count = 0
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if not str(record.msg).startswith(("Created connection", "Closed connection")):
+            self.count += 1
+
+
+class StubREST:
+    def __init__(self, latency: float, limit: int) -> None:
+        self.latency = latency
+        # like ipy, the bucket is only known once a request has gone through
+        self.lock = type("BucketLock", (), {"limit": 1})()
+        self.limit = limit
+        self.calls = 0
+
+    def get_ratelimit(self, route: typing.Any) -> typing.Any:
+        return self.lock
+
+    async def request(self) -> None:
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self.lock.limit = self.limit
+
+
+class FakeRole:
+    def __init__(self, role_id: int) -> None:
+        self.id = role_id
+        self.members: list["FakeMember"] = []
+
+    def __int__(self) -> int:
+        return self.id
+
+
+class FakeMember:
+    __slots__ = ("id", "joined_at", "_role_ids", "_guild_id", "_rest")
+
+    def __init__(
+        self,
+        user_id: int,
+        joined_at: datetime.datetime,
+        role_ids: list[int],
+        rest: StubREST,
+    ) -> None:
+        self.id = user_id
+        self.joined_at = joined_at
+        self._role_ids = role_ids
+        self._guild_id = GUILD_ID
+        self._rest = rest
+
+    def has_role(self, *roles: typing.Any) -> bool:
+        return all(int(role) in self._role_ids for role in roles)
+
+    async def add_role(self, role: typing.Any, reason: typing.Any = None) -> None:
+        await self._rest.request()
+        self._role_ids.append(int(role))
+
+    async def add_roles(self, roles: typing.Any, reason: typing.Any = None) -> None:
+        await self._rest.request()
+        self._role_ids.extend(int(role) for role in roles)
+
+    async def remove_role(self, role: typing.Any, reason: typing.Any = None) -> None:
+        await self._rest.request()
+        with contextlib.suppress(ValueError):
+            self._role_ids.remove(int(role))
+
+    async def remove_roles(self, roles: typing.Any, reason: typing.Any = None) -> None:
+        await self._rest.request()
+        self._role_ids = [r for r in self._role_ids if r not in {int(r) for r in roles}]
+
+
+class FakeGuild:
+    def __init__(self, roles: dict[int, FakeRole], members: dict[int, FakeMember]):
+        self.roles = roles
+        self.members = members
+
+    async def fetch_role(self, role_id: int) -> FakeRole:
+        return self.roles[role_id]
+
+    def get_member(self, user_id: int) -> typing.Optional[FakeMember]:
+        return self.members.get(user_id)
+
+
+class FakeRedis:
+    def __init__(self) -> None:
+        self.sets: dict[str, set[str]] = {}
+
+    async def smembers(self, key: str) -> set[str]:
+        return set(self.sets.get(key, ()))
+
+    async def sadd(self, key: str, *values: typing.Any) -> None:
+        self.sets.setdefault(key, set()).update(str(v) for v in values)
+
+    async def srem(self, key: str, *values: typing.Any) -> None:
+        self.sets.setdefault(key, set()).difference_update(str(v) for v in values)
+
+    async def delete(self, key: str) -> None:
+        self.sets.pop(key, None)
+
+    @contextlib.asynccontextmanager
+    async def pipeline(self) -> typing.AsyncIterator[typing.Any]:
+        # commands in a pipeline are queued up and only run on execute()
+        redis = self
+        pending: list[typing.Awaitable] = []
+
+        class Pipeline:
+            def __getattr__(self, name: str) -> typing.Any:
+                method = getattr(redis, name)
+                return lambda *args, **kwargs: pending.append(method(*args, **kwargs))
+
+            async def execute(self) -> list:
+                results = [await coro for coro in pending]
+                pending.clear()
+                return results
+
+        yield Pipeline()
+
+
+class FakeContext:
+    def __init__(self) -> None:
+        self.channel = self
+        self.typing = contextlib.nullcontext()
+        self.replies: list[str] = []
+
+    async def reply(self, content: str) -> None:
+        self.replies.append(content)
+
+
+class FakeBot:
+    def __init__(self, guild: FakeGuild, rest: StubREST) -> None:
+        self.guild = guild
+        self.http = rest
+        self.owner = type("Owner", (), {"id": OWNER_ID})()
+        self.role_queue = role_queue.RoleMutationQueue(self)  # type: ignore
+
+
+class Result(typing.NamedTuple):
+    name: str
+    wall_time: float
+    queries: int
+    peak_memory: int
+    rest_calls: int
+
+
+async def seed(
+    members: int, code_ratio: float, paid_ratio: float, configs_per_code: int
+) -> list[int]:
+    user_ids = [10**17 + i for i in range(members)]
+    owners = random.sample(user_ids, int(members * code_ratio))
+
+    codes = [
+        models.PremiumCode(
+            code=f"code-{user_id}",
+            user_id=user_id,
+            customer_id=f"cus_{user_id}" if random.random() < paid_ratio else None,
+        )
+        for user_id in owners
+    ]
+    await models.PremiumCode.bulk_create(codes, batch_size=5000)
+
+    code_ids = await models.PremiumCode.all().values_list("id", flat=True)
+    configs = [
+        models.GuildConfig(
+            guild_id=10**16 + (code_id * configs_per_code) + i,
+            premium_code_id=code_id,
+            live_playerlist=True,
+        )
+        for code_id in code_ids
+        for i in range(configs_per_code)
+    ]
+    await models.GuildConfig.bulk_create(configs, batch_size=5000)
+    return user_ids
+
+
+def build_extension(
+    user_ids: list[int], latency: float, bucket_limit: int
+) -> tuple[RealmsPremiumWatch, StubREST]:
+    rest = StubREST(latency, bucket_limit)
+    premium_role = FakeRole(PREMIUM_ROLE_ID)
+    supporter_role = FakeRole(SUPPORTER_ROLE_ID)
+
+    old = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=30)
+    members = {
+        user_id: FakeMember(user_id, old, [PREMIUM_ROLE_ID], rest)
+        for user_id in user_ids
+    }
+    premium_role.members = list(members.values())
+
+    guild = FakeGuild(
+        {PREMIUM_ROLE_ID: premium_role, SUPPORTER_ROLE_ID: supporter_role}, members
+    )
+
+    # skip Extension.__new__/__init__, which would need a real client
+    ext: RealmsPremiumWatch = object.__new__(RealmsPremiumWatch)
+    ext.bot = FakeBot(guild, rest)  # type: ignore
+    ext.premium_role = premium_role  # type: ignore
+    ext.supporter_role = supporter_role  # type: ignore
+    ext.reconciler = premium_sync.PremiumReconciler()
+    ext.membership = premium_sync.PremiumMembershipIndex(FakeRedis())  # type: ignore
+    return ext, rest
+
+
+async def measure(
+    name: str,
+    coro_func: typing.Callable[[], typing.Awaitable[typing.Any]],
+    counter: QueryCounter,
+    rest: StubREST,
+) -> Result:
+    counter.count = 0
+    rest.calls = 0
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    await coro_func()
+    wall_time = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return Result(name, wall_time, counter.count, peak, rest.calls)
+
+
+async def run(args: argparse.Namespace, members: int) -> list[Result]:
+    await Tortoise.init(
+        db_url="sqlite://:memory:", modules={"models": ["common.models"]}
+    )
+    await Tortoise.generate_schemas()
+
+    counter = QueryCounter()
+    db_logger = logging.getLogger("tortoise.db_client")
+    db_logger.setLevel(logging.DEBUG)
+    db_logger.addHandler(counter)
+
+    try:
+        user_ids = await seed(
+            members, args.code_ratio, args.paid_ratio, args.configs_per_code
+        )
+        ext, rest = build_extension(user_ids, args.latency, args.bucket_limit)
+        await ext.membership.rebuild()
+
+        sample = random.sample(user_ids, min(args.events, len(user_ids)))
+        results: list[Result] = []
+
+        results.append(
+            await measure(
+                "update_roles",
+                lambda: RealmsPremiumWatch.update_roles.callback(ext),
+                counter,
+                rest,
+            )
+        )
+
+        async def member_adds() -> None:
+            for user_id in sample:
+                member = ext.bot.guild.get_member(user_id)
+                event = type("MemberAdd", (), {"member": member})()
+                await RealmsPremiumWatch.on_member_add.callback(ext, event)
+
+        results.append(
+            await measure(f"on_member_add x{len(sample)}", member_adds, counter, rest)
+        )
+
+        async def member_updates() -> None:
+            for user_id in sample:
+                after = ext.bot.guild.get_member(user_id)
+                before = FakeMember(
+                    user_id, after.joined_at, [*after._role_ids, PREMIUM_ROLE_ID], rest
+                )
+                after._role_ids = [r for r in after._role_ids if r != PREMIUM_ROLE_ID]
+                event = type("MemberUpdate", (), {"before": before, "after": after})()
+                await RealmsPremiumWatch.on_member_update.callback(ext, event)
+
+        results.append(
+            await measure(
+                f"on_member_update x{len(sample)}", member_updates, counter, rest
+            )
+        )
+
+        results.append(
+            await measure(
+                "reconcile_roles",
+                lambda: RealmsPremiumWatch.reconcile_roles.callback(ext),
+                counter,
+                rest,
+            )
+        )
+
+        results.append(
+            await measure(
+                "refresh_membership",
+                lambda: RealmsPremiumWatch.refresh_membership.callback(ext),
+                counter,
+                rest,
+            )
+        )
+
+        async def member_removes() -> None:
+            for user_id in sample:
+                member = ext.bot.guild.members.pop(user_id, None)
+                event = type("MemberRemove", (), {"member": member})()
+                await RealmsPremiumWatch.on_member_remove.callback(ext, event)
+
+        results.append(
+            await measure(
+                f"on_member_remove x{len(sample)}", member_removes, counter, rest
+            )
+        )
+
+        # drop some members from the role so resync has stale codes to revoke
+        premium_role = ext.premium_role
+        premium_role.members = premium_role.members[: len(premium_role.members) // 2]  # type: ignore
+
+        results.append(
+            await measure(
+                "resync_premium",
+                lambda: RealmsPremiumWatch.resync_premium.callback(ext, FakeContext()),
+                counter,
+                rest,
+            )
+        )
+
+        ext.bot.role_queue.stop()
+        return results
+    finally:
+        db_logger.removeHandler(counter)
+        await Tortoise.close_connections()
+
+
+def print_results(members: int, results: list[Result]) -> None:
+    print(f"\n== {members} members ==")
+    print(
+        f"{'operation':<28}{'wall (s)':>12}{'queries':>10}{'peak (MiB)':>12}{'REST':>8}"
+    )
+    for result in results:
+        print(
+            f"{result.name:<28}{result.wall_time:>12.3f}{result.queries:>10}"
+            f"{result.peak_memory / 2**20:>12.2f}{result.rest_calls:>8}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--members", type=int, nargs="+", default=[10_000])
+    parser.add_argument("--code-ratio", type=float, default=0.9)
+    parser.add_argument("--paid-ratio", type=float, default=0.3)
+    parser.add_argument("--configs-per-code", type=int, default=1)
+    parser.add_argument("--events", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--bucket-limit", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+
+    for members in args.members:
+        print_results(members, asyncio.run(run(args, members)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""
+Checks the query plans of every PremiumCode/GuildConfig query shape used in exts/.
+
+Runs EXPLAIN on each query and fails if any of them falls back to a sequential
+scan of a table, unless the query is expected to read the whole table anyway. Uses an in-memory SQLite database by default, but any database
+Tortoise supports can be passed in with --db-url.
+
+Usage: python -m benchmarks.query_plans [--db-url postgres://...]
+"""
+import argparse
+import asyncio
+import random
+import sys
+import typing
+
+from tortoise import Tortoise
+from tortoise.backends.base.client import BaseDBAsyncClient
+from tortoise.queryset import UpdateQuery
+
+import common.models as models
+from benchmarks.premium_sync import seed
+
+USER_ID = 10**17 + 1
+USER_IDS = [10**17 + i for i in range(0, 500, 5)]
+
+
+class QueryShape(typing.NamedTuple):
+    name: str
+    query: typing.Any  # any tortoise query with a .sql() method
+    # for queries that read (nearly) every row anyway, where a sequential scan
+    # is the right plan
+    allow_full_scan: bool = False
+
+
+def query_shapes() -> list[QueryShape]:
+    # keep this in sync with the queries made in exts/ and common/premium_sync.py
+    return [
+        QueryShape(
+            "PremiumReconciler.full_load",
+            models.PremiumCode.filter(user_id__not_isnull=True).values_list(
+                "user_id", flat=True
+            ),
+            allow_full_scan=True,
+        ),
+        QueryShape(
+            "PremiumReconciler.refresh",
+            models.PremiumCode.filter(user_id__in=USER_IDS).values_list(
+                "user_id", flat=True
+            ),
+        ),
+        QueryShape(
+            "PremiumMembershipIndex.rebuild",
+            models.PremiumCode.filter(
+                user_id__not_isnull=True, customer_id__not_isnull=True
+            ).values_list("user_id", flat=True),
+            allow_full_scan=True,
+        ),
+        QueryShape(
+            "PremiumMembershipIndex.contains/recheck",
+            models.PremiumCode.filter(
+                user_id=USER_ID, customer_id__not_isnull=True
+            ).exists(),
+        ),
+        QueryShape(
+            "RealmsPremiumWatch.revoke_user_codes",
+            models.PremiumCode.filter(
+                user_id=USER_ID, customer_id__isnull=True
+            ).values_list("id", flat=True),
+        ),
+        QueryShape(
+            "revoke_codes (guild configs)",
+            models.GuildConfig.filter(premium_code_id__in=[1, 2, 3]).update(
+                premium_code_id=None,
+                live_playerlist=False,
+                fetch_devices=False,
+                live_online_channel=None,
+            ),
+        ),
+        QueryShape(
+            "revoke_codes (codes)",
+            models.PremiumCode.filter(id__in=[1, 2, 3]).delete(),
+        ),
+        QueryShape(
+            "RealmsPremiumWatch.resync_premium",
+            models.PremiumCode.filter(
+                user_id__not_in=USER_IDS,
+                user_id__not_isnull=True,
+                customer_id__isnull=True,
+            ).values_list("id", "user_id"),
+            allow_full_scan=True,
+        ),
+    ]
+
+
+async def explain(conn: BaseDBAsyncClient, query: typing.Any) -> tuple[list[str], bool]:
+    # returns the plan, and whether it has a sequential scan in it
+    sql = query.sql()
+    # updates are the only queries here that use bound parameters
+    values = query.values if isinstance(query, UpdateQuery) else None
+
+    if conn.capabilities.dialect == "sqlite":
+        rows = await conn.execute_query_dict(f"EXPLAIN QUERY PLAN {sql}", values)
+        plan = [row["detail"] for row in rows]
+        # "SCAN table" is a full table scan, "SCAN table USING (COVERING) INDEX"
+        # walks an index instead
+        seq_scan = any(
+            line.startswith("SCAN ") and " INDEX " not in line for line in plan
+        )
+    else:
+        rows = await conn.execute_query_dict(f"EXPLAIN {sql}", values)
+        plan = [next(iter(row.values())) for row in rows]
+        seq_scan = any("Seq Scan" in line for line in plan)
+
+    return plan, seq_scan
+
+
+async def run(args: argparse.Namespace) -> int:
+    await Tortoise.init(db_url=args.db_url, modules={"models": ["common.models"]})
+    try:
+        conn = Tortoise.get_connection("default")
+
+        seed_rows = args.seed_rows
+        if seed_rows is None:
+            # never seed junk rows into a real database unless asked to
+            seed_rows = 10_000 if args.db_url == "sqlite://:memory:" else 0
+
+        if seed_rows:
+            await Tortoise.generate_schemas(safe=True)
+            await seed(seed_rows, 0.9, 0.3, 1)
+            await conn.execute_script("ANALYZE")
+
+        failures = 0
+        for shape in query_shapes():
+            plan, seq_scan = await explain(conn, shape.query)
+            failed = seq_scan and not shape.allow_full_scan
+            failures += failed
+
+            if not seq_scan:
+                status = "ok"
+            elif shape.allow_full_scan:
+                status = "full scan"  # expected, so not a failure
+            else:
+                status = "SEQ SCAN"
+
+            print(f"{status:<12}{shape.name}")
+            if failed or args.verbose:
+                for line in plan:
+                    print(f"{'':<14}{line}")
+
+        return 1 if failures else 0
+    finally:
+        await Tortoise.close_connections()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--db-url", default="sqlite://:memory:")
+    parser.add_argument(
+        "--seed-rows",
+        type=int,
+        default=None,
+        help=(
+            "rows to seed before checking, so the planner has statistics to use"
+            " - defaults to 10000 for the in-memory database and 0 otherwise"
+        ),
+    )
+    parser.add_argument("--verbose", "-v", action="store_true")
+    args = parser.parse_args()
+
+    random.seed(0)
+    sys.exit(asyncio.run(run(args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+"""
+Load tests for the vote webhook endpoints in exts/vote_handling.py.
+
+Runs the webhook app in-process with aiohttp's test server, with Redis and the
+vote queue stubbed out, and reports requests per second and latency percentiles
+for each endpoint.
+
+Usage: python -m benchmarks.vote_webhooks --requests 5000 --concurrency 50
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import time
+import typing
+
+import orjson
+from aiohttp.test_utils import TestClient
+from aiohttp.test_utils import TestServer
+
+os.environ.setdefault("TOPGG_AUTH", "topgg-auth")
+os.environ.setdefault("DBL_AUTH", "dbl-auth")
+
+from exts.vote_handling import VoteHandling  # noqa: E402
+from exts.vote_handling import WebhookConfig  # noqa: E402
+
+
+class StubRedis:
+    def __init__(self) -> None:
+        self.data: dict[str, typing.Any] = {}
+
+    async def setex(self, key: str, ttl: int, value: typing.Any) -> None:
+        self.data[key] = value
+
+    async def set(
+        self, key: str, value: typing.Any, *, nx: bool = False, ex: int = 0
+    ) -> typing.Optional[bool]:
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+    async def hincrby(self, key: str, field: str, amount: int = 1) -> int:
+        hash_ = self.data.setdefault(key, {})
+        hash_[field] = hash_.get(field, 0) + amount
+        return hash_[field]
+
+    async def delete(self, key: str) -> None:
+        self.data.pop(key, None)
+
+
+class StubQueue:
+    def __init__(self) -> None:
+        self.enqueued = 0
+
+    async def enqueue(self, fields: dict[str, typing.Any]) -> str:
+        self.enqueued += 1
+        return f"{self.enqueued}-0"
+
+
+class Result(typing.NamedTuple):
+    name: str
+    requests: int
+    statuses: dict[int, int]
+    rps: float
+    p50: float
+    p99: float
+
+
+def build_extension() -> VoteHandling:
+    # skip Extension.__new__/__init__, which would need a real client
+    ext: VoteHandling = object.__new__(VoteHandling)
+    ext.bot = type("Bot", (), {"redis": StubRedis()})()  # type: ignore
+    ext.vote_queue = StubQueue()  # type: ignore
+    ext.duplicate_votes = 0
+    ext.webhook_config = WebhookConfig.from_env()
+    ext.webhook_auth = {
+        "/topgg": os.environ["TOPGG_AUTH"].encode(),
+        "/dbl_rpl": os.environ["DBL_AUTH"].encode(),
+        "/dbl_ui": os.environ["DBL_AUTH"].encode(),
+    }
+    return ext
+
+
+def payload_for(path: str, user_id: int) -> dict[str, typing.Any]:
+    if path == "/topgg":
+        return {
+            "bot": "725483868777611275",
+            "user": str(user_id),
+            "type": "upvote",
+            "isWeekend": False,
+        }
+    return {"id": str(user_id), "username": f"user{user_id}", "admin": False}
+
+
+async def load_test(
+    client: TestClient,
+    name: str,
+    path: str,
+    auth: str,
+    requests: int,
+    concurrency: int,
+    body: typing.Optional[typing.Callable[[int], bytes]] = None,
+) -> Result:
+    latencies: list[float] = []
+    statuses: dict[int, int] = {}
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(index: int) -> None:
+        data = (
+            body(index)
+            if body
+            else orjson.dumps(payload_for(path, 10**17 + random.randrange(10**6)))
+        )
+        async with semaphore:
+            start = time.perf_counter()
+            async with client.post(
+                path,
+                data=data,
+                headers={"Authorization": auth, "Content-Type": "application/json"},
+            ) as resp:
+                await resp.read()
+            latencies.append(time.perf_counter() - start)
+            statuses[resp.status] = statuses.get(resp.status, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = time.perf_counter() - start
+
+    quantiles = statistics.quantiles(latencies, n=100)
+    return Result(
+        name, requests, statuses, requests / elapsed, quantiles[49], quantiles[98]
+    )
+
+
+async def run(args: argparse.Namespace) -> list[Result]:
+    ext = build_extension()
+    client = TestClient(TestServer(ext.create_app()))
+    await client.start_server()
+
+    topgg_auth = os.environ["TOPGG_AUTH"]
+    dbl_auth = os.environ["DBL_AUTH"]
+
+    try:
+        results = [
+            await load_test(client, path, path, auth, args.requests, args.concurrency)
+            for path, auth in (
+                ("/topgg", topgg_auth),
+                ("/dbl_rpl", dbl_auth),
+                ("/dbl_ui", dbl_auth),
+            )
+        ]
+
+        # bad requests should be turned away without much work
+        results.append(
+            await load_test(
+                client,
+                "/topgg (bad auth)",
+                "/topgg",
+                "wrong",
+                args.requests,
+                args.concurrency,
+            )
+        )
+        results.append(
+            await load_test(
+                client,
+                "/topgg (oversized)",
+                "/topgg",
+                topgg_auth,
+                args.requests,
+                args.concurrency,
+                body=lambda _: b"{" + b" " * ext.webhook_config.max_body_size + b"}",
+            )
+        )
+        # retries of the same vote should be answered right away
+        duplicate = orjson.dumps(payload_for("/topgg", 10**17))
+        results.append(
+            await load_test(
+                client,
+                "/topgg (retries)",
+                "/topgg",
+                topgg_auth,
+                args.requests,
+                args.concurrency,
+                body=lambda _: duplicate,
+            )
+        )
+        print(f"Duplicates suppressed: {ext.duplicate_votes}")
+        return results
+    finally:
+        await client.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+
+    print(
+        f"{'endpoint':<22}{'requests':>10}{'req/s':>10}{'p50 (ms)':>10}{'p99 (ms)':>10} "
+        " statuses"
+    )
+    for result in results:
+        statuses = ", ".join(f"{k}: {v}" for k, v in sorted(result.statuses.items()))
+        print(
+            f"{result.name:<22}{result.requests:>10}{result.rps:>10.0f}"
+            f"{result.p50 * 1000:>10.2f}{result.p99 * 1000:>10.2f}  {statuses}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+import asyncio
+import collections
+import datetime
+import hashlib
+import os
+import traceback
+import typing
+
+import interactions as ipy
+
+
+class ErrorEntry:
+    __slots__ = (
+        "summary",
+        "location",
+        "count",
+        "unreported",
+        "first_seen",
+        "last_seen",
+    )
+
+    def __init__(self, summary: str, location: str, now: datetime.datetime) -> None:
+        self.summary = summary
+        self.location = location
+        self.count = 0
+        self.unreported = 0
+        self.first_seen = now
+        self.last_seen = now
+
+
+def fingerprint(error: BaseException) -> str:
+    # the message is left out on purpose - it often has ids and the like in it,
+    # which would make every occurrence of the same error look different
+    frames = traceback.extract_tb(error.__traceback__)
+    parts = [f"{type(error).__module__}.{type(error).__qualname__}"]
+    parts.extend(f"{f.filename}:{f.name}:{f.lineno}" for f in frames)
+    return hashlib.sha1("\n".join(parts).encode()).hexdigest()
+
+
+class ErrorDigest:
+    """Keeps track of which errors have been seen recently.
+
+    The first time an error is seen, it should be sent to the owner as usual.
+    Repeats are only counted, and summarised in a digest sent every `interval`
+    seconds. At most `maxsize` different errors are tracked at once - the
+    least recently seen one is forgotten first.
+    """
+
+    def __init__(
+        self,
+        bot: ipy.Client,
+        *,
+        maxsize: int = 256,
+        interval: typing.Optional[float] = None,
+    ) -> None:
+        self.bot = bot
+        self.maxsize = maxsize
+        self.interval = interval or float(
+            os.environ.get("ERROR_DIGEST_INTERVAL", "600")
+        )
+        self.entries: collections.OrderedDict[str, ErrorEntry] = (
+            collections.OrderedDict()
+        )
+        self.evicted = 0
+        self.task: typing.Optional[asyncio.Task] = None
+
+    def record(self, error: BaseException) -> bool:
+        # returns True if this is the first time the error has been seen
+        now = datetime.datetime.now(datetime.timezone.utc)
+        key = fingerprint(error)
+
+        entry = self.entries.get(key)
+        first = entry is None
+        if entry is None:
+            frames = traceback.extract_tb(error.__traceback__)
+            location = (
+                f"{frames[-1].filename}:{frames[-1].lineno} in {frames[-1].name}"
+                if frames
+                else "unknown location"
+            )
+            entry = self.entries[key] = ErrorEntry(
+                f"{type(error).__name__}: {error}"[:200], location, now
+            )
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                self.evicted += 1
+        else:
+            entry.unreported += 1
+            self.entries.move_to_end(key)
+
+        entry.count += 1
+        entry.last_seen = now
+        return first
+
+    def digest(self) -> typing.Optional[str]:
+        repeated = [e for e in self.entries.values() if e.unreported]
+        if not repeated:
+            return None
+
+        lines = [f"**Error digest** ({len(repeated)} repeated errors):"]
+        for entry in sorted(repeated, key=lambda e: e.unreported, reverse=True):
+            lines.append(
+                f"`{entry.summary}` at `{entry.location}` - {entry.unreported} more"
+                f" time(s), {entry.count} total. First seen"
+                f" <t:{int(entry.first_seen.timestamp())}:R>, last seen"
+                f" <t:{int(entry.last_seen.timestamp())}:R>."
+            )
+            entry.unreported = 0
+        return "\n".join(lines)
+
+    def start(self) -> None:
+        self.task = asyncio.create_task(self._run())
+
+    def stop(self) -> None:
+        if self.task:
+            self.task.cancel()
+            self.task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            if digest := self.digest():
+                self.bot.owner_notifier.notify(
+                    digest, self.bot.owner_notifier.PRIORITY_ERROR
+                )
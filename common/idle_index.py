@@ -0,0 +1,71 @@
+import heapq
+import time
+import typing
+
+
+class IdleIndex:
+    """Keeps track of when things were last active, ordered by when they go idle.
+
+    Deadlines are kept in a heap, so finding the next one is O(1) and touching
+    something that's already tracked is only a dict write - its heap entry is
+    left as-is and gets pushed back with the real deadline when it comes up.
+    """
+
+    def __init__(self, idle_after: float) -> None:
+        self.idle_after = idle_after
+        self.last_active: dict[int, float] = {}
+        self._heap: list[tuple[float, int]] = []
+        self._in_heap: set[int] = set()
+
+    def __len__(self) -> int:
+        return len(self.last_active)
+
+    def __contains__(self, key: int) -> bool:
+        return key in self.last_active
+
+    def touch(self, key: int, when: typing.Optional[float] = None) -> bool:
+        # returns True if this made the next deadline come earlier
+        when = time.time() if when is None else when
+        if when <= self.last_active.get(key, float("-inf")):
+            return False
+
+        self.last_active[key] = when
+        if key in self._in_heap:
+            return False
+
+        deadline = when + self.idle_after
+        earliest = self.next_deadline()
+        heapq.heappush(self._heap, (deadline, key))
+        self._in_heap.add(key)
+        return earliest is None or deadline < earliest
+
+    def forget(self, key: int) -> None:
+        # the heap entry is dropped once it comes up
+        self.last_active.pop(key, None)
+
+    def next_deadline(self) -> typing.Optional[float]:
+        while self._heap:
+            deadline, key = self._heap[0]
+            last_active = self.last_active.get(key)
+
+            if last_active is None:
+                heapq.heappop(self._heap)
+                self._in_heap.discard(key)
+            elif last_active + self.idle_after > deadline:
+                # was active since this entry was pushed
+                heapq.heapreplace(self._heap, (last_active + self.idle_after, key))
+            else:
+                return deadline
+        return None
+
+    def pop_expired(self, now: typing.Optional[float] = None) -> list[int]:
+        now = time.time() if now is None else now
+        expired: list[int] = []
+
+        while (deadline := self.next_deadline()) is not None and deadline <= now:
+            _, key = heapq.heappop(self._heap)
+            self._in_heap.discard(key)
+            del self.last_active[key]
+            expired.append(key)
+
+        return expired
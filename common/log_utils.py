@@ -0,0 +1,78 @@
+import copy
+import logging.handlers
+import os
+import queue
+
+import orjson
+
+
+class JSONFormatter(logging.Formatter):
+    # one json object per line, for anything that wants to parse the logs
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data["exc_info"] = record.exc_text
+        return orjson.dumps(data).decode()
+
+
+class LocalQueueHandler(logging.handlers.QueueHandler):
+    # the default prepare() bakes the traceback into the message, which would
+    # make it impossible to log it as its own field
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            # the traceback itself shouldn't be kept alive until it's written
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def file_handler(path: str) -> logging.Handler:
+    # rotates by time if LOG_ROTATE_WHEN is set (ie "midnight"), otherwise by size
+    if when := os.environ.get("LOG_ROTATE_WHEN"):
+        handler: logging.Handler = logging.handlers.TimedRotatingFileHandler(
+            path,
+            when=when,
+            backupCount=int(os.environ.get("LOG_BACKUP_COUNT", "5")),
+            encoding="utf-8",
+            utc=True,
+        )
+    else:
+        handler = logging.handlers.RotatingFileHandler(
+            path,
+            maxBytes=int(os.environ.get("LOG_MAX_BYTES", str(10 * 1024 * 1024))),
+            backupCount=int(os.environ.get("LOG_BACKUP_COUNT", "5")),
+            encoding="utf-8",
+        )
+
+    if os.environ.get("LOG_FORMAT", "text").lower() == "json":
+        handler.setFormatter(JSONFormatter())
+    else:
+        handler.setFormatter(
+            logging.Formatter("%(asctime)s:%(levelname)s:%(name)s: %(message)s")
+        )
+    return handler
+
+
+def setup_queued_logging(
+    logger: logging.Logger, *handlers: logging.Handler
+) -> logging.handlers.QueueListener:
+    # the logger itself only puts records in a queue - the actual writing is done
+    # by the listener's thread, so logging never blocks the event loop on disk io
+    log_queue: queue.SimpleQueue[logging.LogRecord] = queue.SimpleQueue()
+    logger.addHandler(LocalQueueHandler(log_queue))
+
+    listener = logging.handlers.QueueListener(
+        log_queue, *handlers, respect_handler_level=True
+    )
+    listener.start()
+    return listener
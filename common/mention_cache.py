@@ -0,0 +1,90 @@
+import interactions as ipy
+
+import common.utils as utils
+
+
+class MentionCache:
+    """Caches what generate_mentions needs to know, so it doesn't have to look
+    through every role in a guild (or work out channel permissions) every time.
+
+    The mentionable roles of a guild are loaded once and then kept up to date
+    from role events. Permission decisions are cached for each combination of
+    channel, member, member roles and permission overwrites - any role change
+    in a guild invalidates all of its decisions, as the role's permissions
+    could have changed.
+    """
+
+    def __init__(self, *, maxsize: int = 4096, ttl: float = 3600) -> None:
+        self.mentionable: dict[int, set[int]] = {}
+        self._role_lists: dict[int, list[int]] = {}
+        self._versions: dict[int, int] = {}
+        self.decisions: utils.TTLCache[tuple, bool] = utils.TTLCache(maxsize, ttl)
+
+    def mentionable_roles(self, guild: ipy.Guild) -> list[int]:
+        guild_id = int(guild.id)
+        if (roles := self._role_lists.get(guild_id)) is not None:
+            return roles
+
+        if guild_id not in self.mentionable:
+            self.mentionable[guild_id] = {
+                int(r.id) for r in guild.roles if r.mentionable
+            }
+
+        roles = self._role_lists[guild_id] = sorted(self.mentionable[guild_id])
+        return roles
+
+    def can_mention_everyone(
+        self, channel: ipy.GuildChannel, member: ipy.Member
+    ) -> bool:
+        # threads use the permissions of the channel they're in
+        source = (
+            channel.parent_channel
+            if isinstance(channel, ipy.ThreadChannel)
+            else channel
+        )
+        overwrites = tuple(
+            (int(o.id), int(o.allow or 0), int(o.deny or 0))
+            for o in getattr(source, "permission_overwrites", ())
+        )
+        key = (
+            int(channel.id),
+            int(member.id),
+            tuple(member._role_ids),
+            overwrites,
+            self._versions.get(int(member._guild_id), 0),
+        )
+
+        decision = self.decisions.get(key)
+        if decision is None:
+            permissions = channel.permissions_for(member)
+            decision = (
+                ipy.Permissions.ADMINISTRATOR in permissions
+                or ipy.Permissions.MENTION_EVERYONE in permissions
+            )
+            self.decisions.set(key, decision)
+        return decision
+
+    def _changed(self, guild_id: int) -> None:
+        self._role_lists.pop(guild_id, None)
+        self._versions[guild_id] = self._versions.get(guild_id, 0) + 1
+
+    def role_changed(self, guild_id: ipy.Snowflake_Type, role: ipy.Role) -> None:
+        guild_id = int(guild_id)
+        if (roles := self.mentionable.get(guild_id)) is not None:
+            if role.mentionable:
+                roles.add(int(role.id))
+            else:
+                roles.discard(int(role.id))
+        self._changed(guild_id)
+
+    def role_deleted(
+        self, guild_id: ipy.Snowflake_Type, role_id: ipy.Snowflake_Type
+    ) -> None:
+        guild_id = int(guild_id)
+        if (roles := self.mentionable.get(guild_id)) is not None:
+            roles.discard(int(role_id))
+        self._changed(guild_id)
+
+    def forget_guild(self, guild_id: ipy.Snowflake_Type) -> None:
+        self.mentionable.pop(int(guild_id), None)
+        self._changed(int(guild_id))
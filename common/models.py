@@ -2,9 +2,22 @@ import typing
 from datetime import datetime
 
 from tortoise import fields
+from tortoise.indexes import Index
 from tortoise.models import Model
 
 
+class ConditionalIndex(Index):
+    # tortoise's PartialIndex can only express equality conditions, but we need
+    # IS NULL/IS NOT NULL ones
+    INDEX_CREATE_TEMPLATE = (
+        "CREATE INDEX {exists}{index_name} ON {table_name} ({fields}){extra};"
+    )
+
+    def __init__(self, *, fields: tuple[str, ...], name: str, where: str):
+        super().__init__(fields=fields, name=name)  # type: ignore
+        self.extra = f" WHERE {where}"
+
+
 class GuildConfig(Model):
     class Meta:
         table = "realmguildconfig"
@@ -25,12 +38,23 @@ class GuildConfig(Model):
         related_name="guilds",
         on_delete=fields.SET_NULL,
         null=True,
+        index=True,
     )  # type: ignore
 
 
 class PremiumCode(Model):
     class Meta:
         table = "realmpremiumcode"
+        # these aren't created automatically - see scripts/create_indexes.sql
+        indexes = (
+            # lookups by user always filter on whether the code is paid for or not
+            ("user_id", "customer_id"),
+            ConditionalIndex(
+                fields=("user_id",),
+                name="idx_realmpremiumcode_paid_user_id",
+                where="customer_id IS NOT NULL",
+            ),
+        )
 
     id: int = fields.IntField(pk=True)
     code: str = fields.CharField(100)
@@ -0,0 +1,110 @@
+import asyncio
+import heapq
+import itertools
+import logging
+
+import interactions as ipy
+
+import common.utils as utils
+
+
+class OwnerNotifier:
+    """Sends DMs to the owner from one background task.
+
+    Callers only put messages in a bounded priority queue and return right
+    away. Since every DM goes through the one task, they never compete with
+    each other for the DM channel's rate limit, and messages waiting in the
+    queue are merged together (as long as they fit in one message) before
+    they're sent. When the queue is full, the least important message is
+    dropped, and a note of how many were dropped is sent once there's room.
+    """
+
+    # lower numbers go first
+    PRIORITY_ERROR = 0
+    PRIORITY_NORMAL = 1
+    PRIORITY_STATUS = 2
+
+    def __init__(self, bot: ipy.Client, *, maxsize: int = 100) -> None:
+        self.bot = bot
+        self.maxsize = maxsize
+        self.queue: list[tuple[int, int, str]] = []
+        self.task: asyncio.Task | None = None
+        self._counter = itertools.count()
+        self._wakeup = asyncio.Event()
+
+        self.sent = 0
+        self.merged = 0
+        self.dropped = 0
+        self._unreported_drops = 0
+
+    @property
+    def depth(self) -> int:
+        return len(self.queue)
+
+    def notify(self, content: str, priority: int = PRIORITY_NORMAL) -> None:
+        for chunk in utils.pack_messages(str(content)):
+            self._put(priority, chunk)
+        self._wakeup.set()
+
+    def _put(self, priority: int, chunk: str) -> None:
+        entry = (priority, next(self._counter), chunk)
+        if len(self.queue) < self.maxsize:
+            heapq.heappush(self.queue, entry)
+            return
+
+        # drop whatever's least important - the newest message if it's a tie
+        worst = max(self.queue)
+        if entry < worst:
+            self.queue.remove(worst)
+            heapq.heapify(self.queue)
+            heapq.heappush(self.queue, entry)
+
+        self.dropped += 1
+        self._unreported_drops += 1
+        if self._unreported_drops == 1:  # no need to log every single one
+            logging.getLogger("slbot").warning(
+                "Owner notification queue full, dropping messages."
+            )
+
+    def _next_message(self) -> str:
+        if self._unreported_drops:
+            message = (
+                f"*{self._unreported_drops} notification(s) were dropped because too"
+                " many were queued up. Check the logs for details.*"
+            )
+            self._unreported_drops = 0
+        else:
+            message = heapq.heappop(self.queue)[2]
+
+        # merge in whatever comes next, as long as it still fits
+        while self.queue and len(message) + 1 + len(self.queue[0][2]) <= 2000:
+            message = f"{message}\n{heapq.heappop(self.queue)[2]}"
+            self.merged += 1
+        return message
+
+    def start(self) -> None:
+        self.task = asyncio.create_task(self._run())
+
+    def stop(self) -> None:
+        if self.task:
+            self.task.cancel()
+            self.task = None
+
+    async def _run(self) -> None:
+        await self.bot.wait_until_ready()
+
+        while True:
+            if not self.queue and not self._unreported_drops:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+
+            message = self._next_message()
+            try:
+                # the http client waits out rate limits for us - since this is
+                # the only place that DMs the owner, nothing else waits with it
+                await self.bot.owner.send(message)
+                self.sent += 1
+            except Exception as e:
+                # erroring here would just make another notification
+                logging.getLogger("slbot").warning(f"Could not DM owner: {e!r}")
+                await asyncio.sleep(5)
@@ -0,0 +1,139 @@
+import asyncio
+import contextlib
+import typing
+
+import interactions as ipy
+
+
+class PendingPostEdit:
+    __slots__ = ("thread", "tag_ops", "archived", "locked", "futures", "timer")
+
+    def __init__(self, thread: ipy.GuildForumPost) -> None:
+        self.thread = thread
+        # tag changes are only applied when the edit is sent, so that they
+        # build on whatever an earlier edit left behind
+        self.tag_ops: list[tuple[str, int]] = []
+        self.archived: typing.Optional[bool] = None
+        self.locked: typing.Optional[bool] = None
+        self.futures: list[asyncio.Future[ipy.GuildForumPost]] = []
+        self.timer: typing.Optional[asyncio.TimerHandle] = None
+
+    def apply_tags(self, current: list[int]) -> list[int]:
+        tags = list(current)
+        for op, tag_id in self.tag_ops:
+            if op == "add":
+                if tag_id not in tags:
+                    # the solved tag and the like should come first
+                    tags.insert(0, tag_id)
+            elif op == "remove":
+                with contextlib.suppress(ValueError):
+                    tags.remove(tag_id)
+            elif tag_id in tags:
+                tags.remove(tag_id)
+            else:
+                tags.append(tag_id)
+        return tags
+
+    def payload(self, thread: ipy.GuildForumPost) -> dict[str, typing.Any]:
+        # only send what actually changes
+        payload: dict[str, typing.Any] = {}
+        if self.tag_ops:
+            current = [int(t.id) for t in thread.applied_tags]
+            if (tags := self.apply_tags(current)) != current:
+                payload["applied_tags"] = tags
+        if self.archived is not None and self.archived != thread.archived:
+            payload["archived"] = self.archived
+        if self.locked is not None and self.locked != thread.locked:
+            payload["locked"] = self.locked
+        return payload
+
+
+class PostEditBatcher:
+    """Merges edits to forum posts into as few requests as possible.
+
+    Changes to a post's tags, archived and locked state are collected for
+    `debounce` seconds (restarting every time a new change comes in) and then
+    sent as one PATCH. Edits to the same post never run at the same time, so
+    a later batch always builds on the result of the earlier one.
+    """
+
+    def __init__(self, debounce: float = 1.0) -> None:
+        self.debounce = debounce
+        self.pending: dict[int, PendingPostEdit] = {}
+        self.inflight: dict[int, asyncio.Task] = {}
+        self.requests = 0
+        self.merged = 0
+
+    def edit(
+        self,
+        thread: ipy.GuildForumPost,
+        *,
+        add_tags: typing.Iterable[ipy.Snowflake_Type] = (),
+        remove_tags: typing.Iterable[ipy.Snowflake_Type] = (),
+        toggle_tags: typing.Iterable[ipy.Snowflake_Type] = (),
+        archived: typing.Optional[bool] = None,
+        locked: typing.Optional[bool] = None,
+        delay: typing.Optional[float] = None,
+    ) -> asyncio.Future[ipy.GuildForumPost]:
+        thread_id = int(thread.id)
+        pending = self.pending.get(thread_id)
+        if pending:
+            self.merged += 1
+        else:
+            pending = self.pending[thread_id] = PendingPostEdit(thread)
+
+        pending.tag_ops.extend(("add", int(tag_id)) for tag_id in add_tags)
+        pending.tag_ops.extend(("remove", int(tag_id)) for tag_id in remove_tags)
+        pending.tag_ops.extend(("toggle", int(tag_id)) for tag_id in toggle_tags)
+
+        if archived is not None:
+            pending.archived = archived
+        if locked is not None:
+            pending.locked = locked
+
+        loop = asyncio.get_running_loop()
+        future: asyncio.Future[ipy.GuildForumPost] = loop.create_future()
+        pending.futures.append(future)
+
+        if pending.timer:
+            pending.timer.cancel()
+        pending.timer = loop.call_later(
+            self.debounce if delay is None else delay, self._start_flush, thread_id
+        )
+        return future
+
+    def _start_flush(self, thread_id: int) -> None:
+        pending = self.pending.pop(thread_id)
+        previous = self.inflight.get(thread_id)
+
+        task = asyncio.create_task(self._flush(pending, previous))
+        self.inflight[thread_id] = task
+
+        def cleanup(task: asyncio.Task) -> None:
+            if self.inflight.get(thread_id) is task:
+                del self.inflight[thread_id]
+
+        task.add_done_callback(cleanup)
+
+    async def _flush(
+        self, pending: PendingPostEdit, previous: typing.Optional[asyncio.Task]
+    ) -> ipy.GuildForumPost:
+        thread = pending.thread
+        if previous:
+            # build on the post as the earlier edit left it
+            with contextlib.suppress(Exception):
+                thread = await previous
+
+        try:
+            if payload := pending.payload(thread):
+                self.requests += 1
+                thread = await thread.edit(**payload)
+        except Exception as e:
+            for future in pending.futures:
+                if not future.done():
+                    future.set_exception(e)
+        else:
+            for future in pending.futures:
+                if not future.done():
+                    future.set_result(thread)
+        return thread
@@ -0,0 +1,264 @@
+import datetime
+import typing
+
+import redis.asyncio as aioredis
+from tortoise.signals import Signals
+from tortoise.transactions import in_transaction
+
+import common.models as models
+
+
+class PremiumReconciler:
+    """Keeps a live view of which users have a Premium code.
+
+    Rather than reloading every code on every pass, users are marked "dirty" when
+    a code or member event touches them, and only those users are rechecked.
+    """
+
+    def __init__(self) -> None:
+        self.synced_user_ids: set[int] = set()
+        self.dirty_user_ids: set[int] = set()
+        # users that need to be looked at again later, ie those in their grace period
+        self.deferred_user_ids: dict[int, datetime.datetime] = {}
+        self.last_full_load: typing.Optional[datetime.datetime] = None
+
+    async def full_load(self) -> set[int]:
+        # the expensive path - only used on startup and for the rare consistency sweep
+        user_ids = await models.PremiumCode.filter(
+            user_id__not_isnull=True
+        ).values_list("user_id", flat=True)
+        self.synced_user_ids = {int(user_id) for user_id in user_ids}  # type: ignore
+        self.last_full_load = datetime.datetime.now(datetime.timezone.utc)
+        return self.synced_user_ids
+
+    async def refresh(self, user_ids: typing.Iterable[int]) -> None:
+        # rechecks only the users given in one query
+        user_ids = set(user_ids)
+        if not user_ids:
+            return
+
+        found = await models.PremiumCode.filter(user_id__in=user_ids).values_list(
+            "user_id", flat=True
+        )
+        found_ids = {int(user_id) for user_id in found}  # type: ignore
+
+        self.synced_user_ids.difference_update(user_ids - found_ids)
+        self.synced_user_ids.update(found_ids)
+
+    def is_synced(self, user_id: int) -> bool:
+        return user_id in self.synced_user_ids
+
+    def mark_dirty(self, user_id: int) -> None:
+        self.dirty_user_ids.add(user_id)
+
+    def defer(self, user_id: int, until: datetime.datetime) -> None:
+        self.deferred_user_ids[user_id] = until
+
+    def is_deferred(self, user_id: int) -> bool:
+        until = self.deferred_user_ids.get(user_id)
+        return until is not None and until > datetime.datetime.now(
+            datetime.timezone.utc
+        )
+
+    def forget(self, user_id: int) -> None:
+        self.dirty_user_ids.discard(user_id)
+        self.deferred_user_ids.pop(user_id, None)
+
+    def code_removed(self, user_id: typing.Optional[int]) -> None:
+        # a user can own multiple codes, so removing one doesn't mean they lost
+        # all of them - recheck on the next pass instead of guessing
+        if user_id is not None:
+            self.mark_dirty(int(user_id))
+
+    def code_added(self, user_id: typing.Optional[int]) -> None:
+        if user_id is not None:
+            self.synced_user_ids.add(int(user_id))
+            self.mark_dirty(int(user_id))
+
+    def pop_dirty(self) -> set[int]:
+        now = datetime.datetime.now(datetime.timezone.utc)
+        due = {
+            user_id for user_id, until in self.deferred_user_ids.items() if until <= now
+        }
+        for user_id in due:
+            del self.deferred_user_ids[user_id]
+
+        dirty = self.dirty_user_ids | due
+        self.dirty_user_ids = set()
+        return dirty
+
+    async def _on_code_save(
+        self,
+        sender: type[models.PremiumCode],
+        instance: models.PremiumCode,
+        created: bool,
+        *args: typing.Any,
+    ) -> None:
+        if created:
+            self.code_added(instance.user_id)
+        elif instance.user_id is not None:
+            # the user id may have been changed or removed, so we can't be sure
+            # of the previous state here
+            self.mark_dirty(int(instance.user_id))
+
+    async def _on_code_delete(
+        self,
+        sender: type[models.PremiumCode],
+        instance: models.PremiumCode,
+        *args: typing.Any,
+    ) -> None:
+        self.code_removed(instance.user_id)
+
+    def register_listeners(self) -> None:
+        models.PremiumCode.register_listener(Signals.post_save, self._on_code_save)
+        models.PremiumCode.register_listener(Signals.post_delete, self._on_code_delete)
+
+    def unregister_listeners(self) -> None:
+        _unregister_listener(Signals.post_save, self._on_code_save)
+        _unregister_listener(Signals.post_delete, self._on_code_delete)
+
+
+class PremiumMembershipIndex:
+    """An in-process set of users with a paid (customer-linked) Premium code.
+
+    The set is mirrored to Redis so other processes can see it. Codes can be
+    added by another process without us getting a signal, so the set is
+    rebuilt from the database regularly. Lookups only touch the database
+    while the set isn't loaded.
+    """
+
+    REDIS_KEY = "slbot-premium-customers"
+
+    def __init__(self, redis: aioredis.Redis) -> None:
+        self.redis = redis
+        self.user_ids: set[int] = set()
+        self.loaded = False
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    async def rebuild(self) -> None:
+        user_ids = await models.PremiumCode.filter(
+            user_id__not_isnull=True, customer_id__not_isnull=True
+        ).values_list("user_id", flat=True)
+        self.user_ids = {int(user_id) for user_id in user_ids}  # type: ignore
+
+        async with self.redis.pipeline() as pipe:
+            pipe.delete(self.REDIS_KEY)
+            if self.user_ids:
+                pipe.sadd(self.REDIS_KEY, *self.user_ids)
+            await pipe.execute()
+
+        self.loaded = True
+
+    async def invalidate(self) -> None:
+        # drops both copies - every lookup will go to the database until
+        # rebuild() is called again
+        self.loaded = False
+        self.user_ids = set()
+        await self.redis.delete(self.REDIS_KEY)
+
+    async def contains(self, user_id: int) -> bool:
+        # hits are lookups answered from the set, misses had to go to the database
+        if self.loaded:
+            self.hits += 1
+            return user_id in self.user_ids
+
+        self.misses += 1
+        return await models.PremiumCode.exists(
+            user_id=user_id, customer_id__not_isnull=True
+        )
+
+    async def add(self, user_id: int) -> None:
+        self.user_ids.add(user_id)
+        await self.redis.sadd(self.REDIS_KEY, user_id)
+
+    async def discard(self, user_id: int) -> None:
+        self.user_ids.discard(user_id)
+        await self.redis.srem(self.REDIS_KEY, user_id)
+
+    async def recheck(self, user_id: int) -> None:
+        if await models.PremiumCode.exists(
+            user_id=user_id, customer_id__not_isnull=True
+        ):
+            await self.add(user_id)
+        else:
+            await self.discard(user_id)
+
+    async def _on_code_save(
+        self,
+        sender: type[models.PremiumCode],
+        instance: models.PremiumCode,
+        *args: typing.Any,
+    ) -> None:
+        if instance.user_id is None:
+            return
+
+        if instance.customer_id is not None:
+            await self.add(int(instance.user_id))
+        else:
+            await self.recheck(int(instance.user_id))
+
+    async def _on_code_delete(
+        self,
+        sender: type[models.PremiumCode],
+        instance: models.PremiumCode,
+        *args: typing.Any,
+    ) -> None:
+        if instance.user_id is not None and instance.customer_id is not None:
+            await self.recheck(int(instance.user_id))
+
+    def register_listeners(self) -> None:
+        models.PremiumCode.register_listener(Signals.post_save, self._on_code_save)
+        models.PremiumCode.register_listener(Signals.post_delete, self._on_code_delete)
+
+    def unregister_listeners(self) -> None:
+        _unregister_listener(Signals.post_save, self._on_code_save)
+        _unregister_listener(Signals.post_delete, self._on_code_delete)
+
+
+def _unregister_listener(signal: Signals, listener: typing.Callable) -> None:
+    # tortoise has no way of unregistering a listener, so we do it ourselves
+    # this is needed so reloading the extension doesn't leave stale listeners
+    listeners = models.PremiumCode._listeners[signal].get(models.PremiumCode, [])
+    if listener in listeners:
+        listeners.remove(listener)
+
+
+class RevokeResult(typing.NamedTuple):
+    configs_updated: int
+    codes_deleted: int
+
+    @property
+    def total(self) -> int:
+        return self.configs_updated + self.codes_deleted
+
+
+async def revoke_codes(code_ids: typing.Iterable[int]) -> RevokeResult:
+    # revokes any number of codes in two queries, inside of one transaction
+    # this bypasses the model signals, so callers are expected to tell the
+    # reconciler about the affected users themselves
+    code_ids = list(code_ids)
+    if not code_ids:
+        return RevokeResult(0, 0)
+
+    async with in_transaction() as conn:
+        configs_updated = (
+            await models.GuildConfig.filter(premium_code_id__in=code_ids)
+            .using_db(conn)
+            .update(
+                premium_code_id=None,
+                live_playerlist=False,
+                fetch_devices=False,
+                live_online_channel=None,
+            )
+        )
+        codes_deleted = (
+            await models.PremiumCode.filter(id__in=code_ids).using_db(conn).delete()
+        )
+
+    return RevokeResult(configs_updated, codes_deleted)
@@ -0,0 +1,122 @@
+import asyncio
+import collections
+import logging
+import random
+import time
+import typing
+
+T = typing.TypeVar("T")
+
+
+class AttemptRecord(typing.NamedTuple):
+    attempt: int
+    latency: float
+    error: typing.Optional[str]
+
+
+class RetryOutcome(typing.NamedTuple):
+    name: str
+    succeeded: bool
+    attempts: tuple[AttemptRecord, ...]
+    total_delay: float
+
+    @property
+    def total_latency(self) -> float:
+        return sum(a.latency for a in self.attempts)
+
+
+class RetryScheduler:
+    """Retries a coroutine function with jittered exponential backoff.
+
+    The nth retry waits a random amount between 0 and `base_delay * 2**n`
+    (capped at `max_delay`) seconds, so the first retries come quickly and
+    simultaneous failures don't all retry in lockstep. Gives up after
+    `max_attempts` attempts, or once the time spent sleeping would go over
+    `max_total_delay`, whichever comes first. Errors matching `retry_on` are
+    only retried if `should_retry` (when given) says they're worth retrying.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_attempts: int = 5,
+        base_delay: float = 0.5,
+        max_delay: float = 8,
+        max_total_delay: float = 30,
+        retry_on: tuple[type[BaseException], ...] = (Exception,),
+        should_retry: typing.Optional[typing.Callable[[typing.Any], bool]] = None,
+        history: int = 100,
+    ) -> None:
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_total_delay = max_total_delay
+        self.retry_on = retry_on
+        self.should_retry = should_retry
+        self.history: collections.deque[RetryOutcome] = collections.deque(
+            maxlen=history
+        )
+
+    def delay_for(self, retry: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**retry))
+
+    async def run(
+        self,
+        func: typing.Callable[..., typing.Awaitable[T]],
+        *args: typing.Any,
+        name: typing.Optional[str] = None,
+        **kwargs: typing.Any,
+    ) -> T:
+        name = name or getattr(func, "__qualname__", repr(func))
+        attempts: list[AttemptRecord] = []
+        total_delay = 0.0
+
+        while True:
+            start = time.perf_counter()
+            try:
+                result = await func(*args, **kwargs)
+            except self.retry_on as e:
+                attempts.append(
+                    AttemptRecord(
+                        len(attempts) + 1, time.perf_counter() - start, repr(e)
+                    )
+                )
+
+                delay = self.delay_for(len(attempts) - 1)
+                if (
+                    len(attempts) >= self.max_attempts
+                    or total_delay + delay > self.max_total_delay
+                    or (self.should_retry and not self.should_retry(e))
+                ):
+                    self._record(name, False, attempts, total_delay)
+                    raise
+
+                total_delay += delay
+                await asyncio.sleep(delay)
+            else:
+                attempts.append(
+                    AttemptRecord(len(attempts) + 1, time.perf_counter() - start, None)
+                )
+                self._record(name, True, attempts, total_delay)
+                return result
+
+    def _record(
+        self,
+        name: str,
+        succeeded: bool,
+        attempts: list[AttemptRecord],
+        total_delay: float,
+    ) -> None:
+        outcome = RetryOutcome(name, succeeded, tuple(attempts), total_delay)
+        self.history.append(outcome)
+
+        if not succeeded:
+            logging.getLogger("slbot").warning(
+                f"{name}: gave up after {len(attempts)} attempts and"
+                f" {total_delay:.2f}s of backoff. Last error: {attempts[-1].error}"
+            )
+        elif len(attempts) > 1:
+            logging.getLogger("slbot").info(
+                f"{name}: succeeded on attempt {len(attempts)} after"
+                f" {total_delay:.2f}s of backoff."
+            )
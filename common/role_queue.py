@@ -0,0 +1,209 @@
+import asyncio
+import itertools
+import logging
+import time
+import typing
+
+import interactions as ipy
+from interactions.api.http.route import Route
+
+# lower numbers go first - interactive jobs should never wait behind a sweep
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 1
+
+
+class RoleJob(typing.NamedTuple):
+    member: ipy.Member
+    role_ids: tuple[int, ...]
+    add: bool
+    reason: typing.Optional[str] = None
+
+
+class RoleQueueReport(typing.NamedTuple):
+    total: int
+    succeeded: int
+    failed: int
+    retries: int
+    duration: float
+
+
+class RoleMutationQueue:
+    """A queue for adding and removing roles from members.
+
+    Jobs are run by a small pool of workers. The amount of workers follows
+    the rate limit bucket Discord gives us for role changes in the guild, so
+    bulk sweeps don't starve interactive role changes (or vice versa).
+    """
+
+    def __init__(
+        self,
+        bot: ipy.Client,
+        *,
+        max_concurrency: int = 5,
+        max_retries: int = 3,
+    ) -> None:
+        self.bot = bot
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+
+        self.queue: asyncio.PriorityQueue[
+            tuple[int, int, RoleJob, asyncio.Future[None]]
+        ] = asyncio.PriorityQueue()
+        self.workers: list[asyncio.Task] = []
+        self.retries = 0
+        self._counter = itertools.count()  # keeps jobs of the same priority in order
+
+    def route_for(self, job: RoleJob) -> Route:
+        # ratelimit buckets depend on the method as well as the path, so this
+        # has to be the request the job actually makes
+        if len(job.role_ids) == 1:
+            return Route(
+                "PUT" if job.add else "DELETE",
+                "/guilds/{guild_id}/members/{user_id}/roles/{role_id}",
+                guild_id=job.member._guild_id,
+                user_id=job.member.id,
+                role_id=job.role_ids[0],
+            )
+        # changing several roles at once edits the member instead
+        return Route(
+            "PATCH",
+            "/guilds/{guild_id}/members/{user_id}",
+            guild_id=job.member._guild_id,
+            user_id=job.member.id,
+        )
+
+    def concurrency_for(self, job: RoleJob) -> int:
+        # role changes for a guild all share one bucket, so there's no point in
+        # running more requests at once than the bucket allows
+        # until a request has gone through, the bucket is unknown and says 1
+        lock = self.bot.http.get_ratelimit(self.route_for(job))
+        return max(1, min(self.max_concurrency, lock.limit))
+
+    def _ensure_workers(self, job: RoleJob) -> None:
+        self.workers = [w for w in self.workers if not w.done()]
+        wanted = self.concurrency_for(job)
+
+        while len(self.workers) < wanted:
+            self.workers.append(asyncio.create_task(self._worker()))
+
+    async def _worker(self) -> None:
+        while True:
+            _, _, job, future = await self.queue.get()
+            try:
+                if not future.done():
+                    await self._run_job(job)
+                    future.set_result(None)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            finally:
+                self.queue.task_done()
+
+            # the request will have told us the real size of the bucket, so
+            # bring up more workers if it allows for them
+            self._ensure_workers(job)
+
+    async def _run_job(self, job: RoleJob) -> None:
+        for attempt in range(self.max_retries + 1):
+            try:
+                if job.add and len(job.role_ids) == 1:
+                    await job.member.add_role(job.role_ids[0], reason=job.reason)
+                elif job.add:
+                    await job.member.add_roles(job.role_ids, reason=job.reason)
+                elif len(job.role_ids) == 1:
+                    await job.member.remove_role(job.role_ids[0], reason=job.reason)
+                else:
+                    await job.member.remove_roles(job.role_ids, reason=job.reason)
+                return
+            except ipy.errors.HTTPException as e:
+                # the http client already waits out most ratelimits itself, but
+                # if it gives up, we back off a bit more before trying again
+                if e.status != 429 or attempt >= self.max_retries:
+                    raise
+
+                self.retries += 1
+                await asyncio.sleep(2**attempt)
+
+    def submit(
+        self, job: RoleJob, priority: int = PRIORITY_INTERACTIVE
+    ) -> asyncio.Future:
+        self._ensure_workers(job)
+
+        future: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((priority, next(self._counter), job, future))
+        return future
+
+    async def add(
+        self,
+        member: ipy.Member,
+        *roles: ipy.Snowflake_Type | ipy.Role,
+        reason: typing.Optional[str] = None,
+    ) -> None:
+        await self.submit(
+            RoleJob(member, tuple(ipy.to_snowflake(r) for r in roles), True, reason)
+        )
+
+    async def remove(
+        self,
+        member: ipy.Member,
+        *roles: ipy.Snowflake_Type | ipy.Role,
+        reason: typing.Optional[str] = None,
+    ) -> None:
+        await self.submit(
+            RoleJob(member, tuple(ipy.to_snowflake(r) for r in roles), False, reason)
+        )
+
+    async def run_batch(
+        self,
+        jobs: typing.Iterable[RoleJob],
+        *,
+        name: str = "role batch",
+        progress_every: int = 100,
+        on_progress: typing.Optional[
+            typing.Callable[[int, int], typing.Awaitable[None]]
+        ] = None,
+    ) -> RoleQueueReport:
+        start = time.perf_counter()
+        retries_before = self.retries
+
+        futures = [self.submit(job, PRIORITY_BULK) for job in jobs]
+        total = len(futures)
+        succeeded = failed = 0
+        logger = logging.getLogger("slbot")
+
+        for done, future in enumerate(asyncio.as_completed(futures), start=1):
+            try:
+                await future
+                succeeded += 1
+            except Exception as e:
+                failed += 1
+                logger.warning(f"{name}: role change failed: {e!r}")
+
+            if done % progress_every == 0 or done == total:
+                logger.info(f"{name}: {done}/{total} role changes processed.")
+                if on_progress:
+                    await on_progress(done, total)
+
+        report = RoleQueueReport(
+            total,
+            succeeded,
+            failed,
+            self.retries - retries_before,
+            time.perf_counter() - start,
+        )
+        logger.info(
+            f"{name}: finished {report.total} role changes in"
+            f" {report.duration:.2f}s ({report.failed} failed, {report.retries}"
+            " retries)."
+        )
+        return report
+
+    def stop(self) -> None:
+        for worker in self.workers:
+            worker.cancel()
+        self.workers.clear()
+
+        while not self.queue.empty():
+            _, _, _, future = self.queue.get_nowait()
+            future.cancel()
+            self.queue.task_done()
@@ -0,0 +1,49 @@
+import math
+import typing
+
+
+class LogHistogram:
+    """A streaming quantile sketch with a fixed relative error.
+
+    Values are counted in logarithmically sized buckets, so recording a value
+    is a single counter increment (which can be a HINCRBY in Redis), and the
+    amount of buckets - and so the cost of a query - only depends on the range
+    of values, not on how many were recorded. Any quantile is accurate to
+    within `relative_accuracy` of the real value.
+    """
+
+    def __init__(self, relative_accuracy: float = 0.02, min_value: float = 1.0) -> None:
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.min_value = min_value
+
+    def bucket(self, value: float) -> int:
+        return math.ceil(math.log(max(value, self.min_value)) / self.log_gamma)
+
+    def value(self, bucket: int) -> float:
+        # the midpoint of the bucket, in terms of relative error
+        return 2 * self.gamma**bucket / (self.gamma + 1)
+
+    def quantiles(
+        self, counts: typing.Mapping[typing.Any, typing.Any], qs: typing.Iterable[float]
+    ) -> list[typing.Optional[float]]:
+        # counts can come straight from HGETALL, so everything might be strings
+        buckets = sorted((int(b), int(c)) for b, c in counts.items())
+        total = sum(c for _, c in buckets)
+        if not total:
+            return [None for _ in qs]
+
+        results: list[typing.Optional[float]] = []
+        for q in qs:
+            rank = q * (total - 1)
+            seen = 0
+            for bucket, count in buckets:
+                seen += count
+                if seen > rank:
+                    results.append(self.value(bucket))
+                    break
+        return results
+
+    @staticmethod
+    def count(counts: typing.Mapping[typing.Any, typing.Any]) -> int:
+        return sum(int(c) for c in counts.values())
@@ -0,0 +1,158 @@
+import asyncio
+import contextlib
+import logging
+import typing
+
+import orjson
+import redis.asyncio as aioredis
+from redis.exceptions import ResponseError
+
+Handler = typing.Callable[[dict[str, str]], typing.Awaitable[typing.Any]]
+FailureHandler = typing.Callable[
+    [dict[str, str], Exception], typing.Awaitable[typing.Any]
+]
+
+
+class StreamQueue:
+    """A durable job queue built on top of a Redis Stream and consumer group.
+
+    Jobs are written to the stream before the producer moves on, and are
+    processed by a fixed pool of workers. Jobs are only acknowledged once they
+    were handled - if handling fails (or the process dies mid-way), the job
+    stays pending and is claimed again after `retry_after` seconds. Jobs that
+    fail `max_attempts` times are moved to a dead-letter list.
+    """
+
+    def __init__(
+        self,
+        redis: aioredis.Redis,
+        name: str,
+        handler: Handler,
+        *,
+        workers: int = 4,
+        batch_size: int = 10,
+        max_attempts: int = 5,
+        retry_after: float = 30,
+        max_length: int = 10000,
+        on_dead: typing.Optional[FailureHandler] = None,
+    ) -> None:
+        self.redis = redis
+        self.stream = name
+        self.group = f"{name}-workers"
+        self.attempts_key = f"{name}-attempts"
+        self.dead_key = f"{name}-dead"
+
+        self.handler = handler
+        self.on_dead = on_dead
+        self.worker_count = workers
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.retry_after = retry_after
+        self.max_length = max_length
+
+        self.workers: list[asyncio.Task] = []
+        self.processed = 0
+        self.failed = 0
+        self.dead = 0
+
+    async def enqueue(self, fields: dict[str, typing.Any]) -> str:
+        # the stream is capped so that it can't grow forever if workers fall behind
+        return await self.redis.xadd(
+            self.stream,
+            {k: str(v) for k, v in fields.items()},
+            maxlen=self.max_length,
+            approximate=True,
+        )
+
+    async def start(self) -> None:
+        with contextlib.suppress(ResponseError):  # group already exists
+            await self.redis.xgroup_create(
+                self.stream, self.group, id="0", mkstream=True
+            )
+
+        self.workers = [
+            asyncio.create_task(self._worker(f"worker-{i}"))
+            for i in range(self.worker_count)
+        ]
+
+    def stop(self) -> None:
+        # anything in progress stays pending and will be picked up on the next start
+        for worker in self.workers:
+            worker.cancel()
+        self.workers.clear()
+
+    async def dead_letters(self, count: int = 10) -> list[dict[str, typing.Any]]:
+        return [
+            orjson.loads(e)
+            for e in await self.redis.lrange(self.dead_key, 0, count - 1)
+        ]
+
+    async def _worker(self, consumer: str) -> None:
+        logger = logging.getLogger("slbot")
+
+        while True:
+            try:
+                # pick up anything that has been pending for too long first -
+                # either something that failed, or something a previous run
+                # of the bot didn't get to finish
+                claimed = await self.redis.xautoclaim(
+                    self.stream,
+                    self.group,
+                    consumer,
+                    min_idle_time=int(self.retry_after * 1000),
+                    count=self.batch_size,
+                )
+                entries = claimed[1]
+
+                if not entries:
+                    response = await self.redis.xreadgroup(
+                        self.group,
+                        consumer,
+                        {self.stream: ">"},
+                        count=self.batch_size,
+                        block=5000,
+                    )
+                    entries = response[0][1] if response else []
+
+                for entry_id, fields in entries:
+                    if fields:  # entries trimmed from the stream come back empty
+                        await self._process(entry_id, fields)
+                    else:
+                        await self.redis.xack(self.stream, self.group, entry_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # most likely a redis disconnect - don't spin while it comes back
+                logger.warning(f"{self.stream}: worker {consumer} errored: {e!r}")
+                await asyncio.sleep(5)
+
+    async def _process(self, entry_id: str, fields: dict[str, str]) -> None:
+        try:
+            await self.handler(fields)
+        except Exception as e:
+            self.failed += 1
+            attempts = await self.redis.hincrby(self.attempts_key, entry_id, 1)
+            if attempts < self.max_attempts:
+                logging.getLogger("slbot").warning(
+                    f"{self.stream}: {entry_id} failed (attempt {attempts}): {e!r}"
+                )
+                return
+
+            self.dead += 1
+            dead_letter = {"id": entry_id, "fields": fields, "error": repr(e)}
+            async with self.redis.pipeline() as pipe:
+                pipe.lpush(self.dead_key, orjson.dumps(dead_letter))
+                pipe.ltrim(self.dead_key, 0, self.max_length - 1)
+                pipe.xack(self.stream, self.group, entry_id)
+                pipe.hdel(self.attempts_key, entry_id)
+                await pipe.execute()
+
+            if self.on_dead:
+                await self.on_dead(fields, e)
+            return
+
+        self.processed += 1
+        async with self.redis.pipeline() as pipe:
+            pipe.xack(self.stream, self.group, entry_id)
+            pipe.hdel(self.attempts_key, entry_id)
+            await pipe.execute()
@@ -1,6 +1,7 @@
 import asyncio
 import collections
 import logging
+import time
 import traceback
 import typing
 from pathlib import Path
@@ -10,6 +11,13 @@ import interactions as ipy
 import redis.asyncio as aioredis
 from interactions.ext import prefixed_commands as prefixed
 
+if typing.TYPE_CHECKING:
+    from common.error_digest import ErrorDigest
+    from common.ext_loader import StartupReport
+    from common.mention_cache import MentionCache
+    from common.owner_notify import OwnerNotifier
+    from common.role_queue import RoleMutationQueue
+
 
 class CustomCheckFailure(ipy.errors.BadArgument):
     # custom classs for custom prerequisite failures outside of normal command checks
@@ -33,28 +41,41 @@ def permissions_check(ctx: ipy.BaseContext):
     )
 
 
-async def error_handle(bot: ipy.Client, error: Exception, ctx: ipy.BaseContext = None):
-    # handles errors and sends them to owner
+def error_message(error: Exception, ctx: ipy.BaseContext = None):
+    # formats an error into a message to send to the owner
+    content = f"```py\n{error_format(error)}\n```"
+    if ctx and hasattr(ctx, "message") and hasattr(ctx.message, "jump_url"):
+        content = f"Error on: {ctx.message.jump_url}\n{content}"
+    return content
+
+
+def report_error(
+    bot: ipy.Client,
+    error: Exception,
+    ctx: ipy.BaseContext = None,
+    *,
+    skip_digest: bool = False,
+) -> bool:
+    # sends the error to the owner in the background if it's new - repeats end
+    # up in the next error digest instead, unless skip_digest is set
+    # returns whether the owner was notified right away
+    notifier = bot.owner_notifier
     if isinstance(error, aiohttp.ServerDisconnectedError):
-        to_send = "Disconnected from server!"
-        split = True
-    else:
-        error_str = error_format(error)
-        logging.getLogger("slbot").error(error_str)
-
-        chunks = line_split(error_str)
-        for i in range(len(chunks)):
-            chunks[i][0] = f"```py\n{chunks[i][0]}"
-            chunks[i][len(chunks[i]) - 1] += "\n```"
+        if skip_digest or bot.error_digest.record(error):
+            notifier.notify("Disconnected from server!", notifier.PRIORITY_ERROR)
+            return True
+        return False
 
-        final_chunks = ["\n".join(chunk) for chunk in chunks]
-        if ctx and hasattr(ctx, "message") and hasattr(ctx.message, "jump_url"):
-            final_chunks.insert(0, f"Error on: {ctx.message.jump_url}")
+    logging.getLogger("slbot").error(error_format(error))
+    if skip_digest or bot.error_digest.record(error):
+        notifier.notify(error_message(error, ctx), notifier.PRIORITY_ERROR)
+        return True
+    return False
 
-        to_send = final_chunks
-        split = False
 
-    await msg_to_owner(bot, to_send, split)
+async def error_handle(bot: ipy.Client, error: Exception, ctx: ipy.BaseContext = None):
+    # handles errors and sends them to owner
+    report_error(bot, error, ctx)
 
     if ctx:
         if isinstance(ctx, prefixed.PrefixedContext):
@@ -70,46 +91,169 @@ async def error_handle(bot: ipy.Client, error: Exception, ctx: ipy.BaseContext =
 
 
 async def msg_to_owner(bot: ipy.Client, content, split=True):
-    # sends a message to the owner
-    string = str(content)
-
-    str_chunks = string_split(string) if split else content
+    # queues up a message to the owner - this returns right away
+    str_chunks = [str(content)] if split else content
     for chunk in str_chunks:
-        await bot.owner.send(f"{chunk}")
+        bot.owner_notifier.notify(f"{chunk}")
 
 
-def line_split(content: str, split_by=20):
-    content_split = content.splitlines()
-    return [
-        content_split[x : x + split_by] for x in range(0, len(content_split), split_by)
-    ]
+def pack_messages(content: str, limit: int = 2000) -> list[str]:
+    """Packs whole lines into as few messages of at most `limit` characters as
+    possible. Lines too long for a message on their own are wrapped, and code
+    blocks cut off by a message break are closed and reopened in the next one.
+    """
+    messages: list[str] = []
+    current: list[str] = []
+    size = 0
+    fence: typing.Optional[str] = None  # the opening line of the open code block
+
+    def add_message(message: str):
+        # discord won't send a message that's only whitespace
+        if message.strip():
+            messages.append(message)
+
+    def flush():
+        nonlocal current, size
+        if fence:
+            current.append("```")
+        add_message("\n".join(current))
+        current = [fence] if fence else []
+        size = len(fence) if fence else 0
+
+    for line in content.splitlines():
+        fence_line = line.strip() if line.lstrip().startswith("```") else None
+
+        while True:
+            # always leave room for the fence that might need to close the block
+            room = limit - 4 - size - (1 if current else 0)
+            if len(line) <= room:
+                size += len(line) + (1 if current else 0)
+                current.append(line)
+                break
+
+            if room > 0 and len(line) > limit - 4 - (len(fence) + 1 if fence else 0):
+                # this line has to be wrapped anyway, so fill up what's left first
+                size += room + (1 if current else 0)
+                current.append(line[:room])
+                line = line[room:]
+            flush()
+
+        if fence_line:
+            fence = None if fence else fence_line
+
+    if current and current != [fence]:
+        if fence:
+            current.append("```")
+        add_message("\n".join(current))
+
+    return messages
+
+
+# see https://discord.com/developers/docs/resources/channel#embed-limits
+EMBED_TITLE_LIMIT = 256
+EMBED_DESCRIPTION_LIMIT = 4096
+EMBED_FIELD_NAME_LIMIT = 256
+EMBED_FIELD_VALUE_LIMIT = 1024
+EMBED_FOOTER_LIMIT = 2048
+EMBED_AUTHOR_LIMIT = 256
+EMBED_FIELD_COUNT_LIMIT = 25
+EMBED_TOTAL_LIMIT = 6000  # this applies to all of the embeds in a message together
+EMBEDS_PER_MESSAGE = 10
 
 
 def embed_check(embed: ipy.Embed) -> bool:
     """Checks if an embed is valid, as per Discord's guidelines.
     See https://discord.com/developers/docs/resources/channel#embed-limits for details.
     """
-    if len(embed) > 6000:
-        return False
+    return (
+        len(embed) <= EMBED_TOTAL_LIMIT
+        and len(embed.title or "") <= EMBED_TITLE_LIMIT
+        and len(embed.description or "") <= EMBED_DESCRIPTION_LIMIT
+        and len(embed.author.name if embed.author else "") <= EMBED_AUTHOR_LIMIT
+        and len(embed.footer.text if embed.footer else "") <= EMBED_FOOTER_LIMIT
+        and len(embed.fields) <= EMBED_FIELD_COUNT_LIMIT
+        and all(
+            len(field.name) <= EMBED_FIELD_NAME_LIMIT
+            and len(field.value) <= EMBED_FIELD_VALUE_LIMIT
+            for field in embed.fields
+        )
+    )
 
-    if embed.title and len(embed.title) > 256:
-        return False
-    if embed.description and len(embed.description) > 4096:
-        return False
-    if embed.author and embed.author.name and len(embed.author.name) > 256:
-        return False
-    if embed.footer and embed.footer.text and len(embed.footer.text) > 2048:
-        return False
-    if embed.fields:
-        if len(embed.fields) > 25:
-            return False
-        for field in embed.fields:
-            if field.name and len(field.name) > 1024:
-                return False
-            if field.value and len(field.value) > 2048:
-                return False
 
-    return True
+def truncate(text: str, limit: int) -> str:
+    return text if len(text) <= limit else f"{text[: limit - 1]}…"
+
+
+def fit_embed(
+    embed: ipy.Embed,
+    fields: typing.Iterable[tuple[str, str] | tuple[str, str, bool]] = (),
+) -> list[ipy.Embed]:
+    """Makes an embed fit Discord's limits instead of failing to send.
+    `fields` are added after the embed's own fields, truncated as needed - the
+    embed itself won't take fields that are too long. Fields that don't fit
+    in the embed spill over into extra embeds with the same title and color.
+    """
+    if embed.description:
+        # everything else in the embed has to fit in the total limit too
+        others = len(embed) - len(embed.description) - sum(map(len, embed.fields))
+        embed.description = truncate(embed.description, EMBED_TOTAL_LIMIT - others)
+
+    all_fields = list(embed.fields)
+    for field in fields:
+        name, value, *inline = field
+        all_fields.append(
+            ipy.EmbedField(
+                truncate(name, EMBED_FIELD_NAME_LIMIT),
+                truncate(str(value), EMBED_FIELD_VALUE_LIMIT),
+                bool(inline and inline[0]),
+            )
+        )
+    embed.fields = []
+
+    embeds = [embed]
+    size = len(embed)
+    for field in all_fields:
+        if (
+            len(embeds[-1].fields) >= EMBED_FIELD_COUNT_LIMIT
+            or size + len(field) > EMBED_TOTAL_LIMIT
+        ):
+            title = (
+                truncate(f"{embed.title} (cont.)", EMBED_TITLE_LIMIT)
+                if embed.title
+                else None
+            )
+            embeds.append(ipy.Embed(title=title, color=embed.color))
+            size = len(embeds[-1])
+
+        embeds[-1].fields.append(field)
+        size += len(field)
+
+    return embeds
+
+
+def fit_embed_messages(
+    *embeds: ipy.Embed,
+    fields: typing.Iterable[tuple[str, str] | tuple[str, str, bool]] = (),
+) -> list[list[ipy.Embed]]:
+    """Fits the embeds and packs them into as few messages as possible.
+    Any `fields` are added to the last embed, which makes this useful for
+    lists of fields far too big for one embed or even one message.
+    """
+    messages: list[list[ipy.Embed]] = [[]]
+    size = 0
+    for index, embed in enumerate(embeds):
+        for fitted in fit_embed(embed, fields if index == len(embeds) - 1 else ()):
+            if messages[-1] and (
+                len(messages[-1]) >= EMBEDS_PER_MESSAGE
+                or size + len(fitted) > EMBED_TOTAL_LIMIT
+            ):
+                messages.append([])
+                size = 0
+
+            messages[-1].append(fitted)
+            size += len(fitted)
+
+    return messages if messages[0] else []
 
 
 def deny_mentions(user):
@@ -126,11 +270,6 @@ def error_format(error: Exception):
     )
 
 
-def string_split(string):
-    # simple function that splits a string into 1950-character parts
-    return [string[i : i + 1950] for i in range(0, len(string), 1950)]
-
-
 def file_to_ext(str_path, base_path):
     # changes a file to an import-like string
     str_path = str_path.replace(base_path, "")
@@ -176,15 +315,11 @@ def error_embed_generate(error_msg):
 
 def generate_mentions(ctx: ipy.BaseContext):
     # generates an AllowedMentions object that is similar to what a user can usually use
-
-    permissions = ctx.channel.permissions_for(ctx.author)
-    if (
-        ipy.Permissions.ADMINISTRATOR in permissions
-        or ipy.Permissions.MENTION_EVERYONE in permissions
-    ):
+    # both the permission check and the roles are cached - see common/mention_cache.py
+    if ctx.bot.mention_cache.can_mention_everyone(ctx.channel, ctx.author):
         return ipy.AllowedMentions.all()
 
-    pingable_roles = tuple(r for r in ctx.guild.roles if r.mentionable)
+    pingable_roles = ctx.bot.mention_cache.mentionable_roles(ctx.guild)
     return ipy.AllowedMentions(parse=["users"], roles=pingable_roles)
 
 
@@ -201,6 +336,56 @@ def role_check(ctx: ipy.BaseContext, role: ipy.Role):
     return True
 
 
+KT = typing.TypeVar("KT")
+VT = typing.TypeVar("VT")
+
+
+class TTLCache(typing.Generic[KT, VT]):
+    """A bounded LRU cache whose entries also expire after a set time."""
+
+    def __init__(self, maxsize: int, ttl: float) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: collections.OrderedDict[KT, tuple[float, VT]] = (
+            collections.OrderedDict()
+        )
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def get(self, key: KT) -> typing.Optional[VT]:
+        entry = self._data.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._data[key]
+            self.misses += 1
+            return None
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key: KT, value: VT) -> None:
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: KT) -> typing.Optional[VT]:
+        entry = self._data.pop(key, None)
+        return entry[1] if entry else None
+
+    def clear(self) -> None:
+        self._data.clear()
+
+
 async def _global_checks(ctx: ipy.BaseContext):
     return False if ctx.bot.init_load else bool(ctx.guild)
 
@@ -220,3 +405,8 @@ class SLBotBase(prefixed.PrefixedInjectedClient):
         redis: aioredis.Redis
         guild: ipy.Guild
         fully_ready: asyncio.Event
+        role_queue: RoleMutationQueue
+        error_digest: ErrorDigest
+        mention_cache: MentionCache
+        owner_notifier: OwnerNotifier
+        startup_report: StartupReport
@@ -1,24 +1,328 @@
 import asyncio
+import contextlib
+import datetime
 import importlib
+import os
+import time
 
 import interactions as ipy
+from interactions.ext import prefixed_commands as prefixed
 
+import common.idle_index as idle_index
+import common.post_edits as post_edits
+import common.retry as retry
+import common.sketch as sketch
 import common.utils as utils
 
+METRICS_KEY = "slbot-help-metrics"
+# per-week and per-thread keys aren't worth keeping around forever
+METRICS_EXPIRY = int(datetime.timedelta(days=180).total_seconds())
+METRICS_WEEKS = 8
+METRICS_SKETCH = sketch.LogHistogram(relative_accuracy=0.02)
+METRICS_QUANTILES = (0.5, 0.9, 0.99)
+
+
+def week_of(when: datetime.datetime) -> str:
+    return when.strftime("%G-W%V")
+
+
+def format_duration(seconds: float) -> str:
+    seconds = int(seconds)
+    days, seconds = divmod(seconds, 86400)
+    hours, seconds = divmod(seconds, 3600)
+    minutes, seconds = divmod(seconds, 60)
+
+    if days:
+        return f"{days}d {hours}h"
+    if hours:
+        return f"{hours}h {minutes}m"
+    if minutes:
+        return f"{minutes}m {seconds}s"
+    return f"{seconds}s"
+
+
+def greeting_should_retry(error: ipy.errors.HTTPException) -> bool:
+    # ratelimits and discord having a bad time are worth waiting out, and so is
+    # discord not knowing about the thread's first message yet - missing
+    # permissions or a deleted thread won't fix themselves, though
+    if error.status == 429 or error.status >= 500:
+        return True
+    return error.status == 400 and "initial message" in str(error.text)
+
 
 class HelpForum(ipy.Extension):
     def __init__(self, bot: ipy.Client):
         self.client = bot
         self.help_channel: ipy.GuildForum = None  # type: ignore
         self.solved_tag = 1040471298746359928
+        # the tags barely ever change, so there's no need to rebuild this every time
+        self.tag_select_cache: dict[tuple[int, ...], ipy.StringSelectMenu] = {}
+        self.greeting_retry = retry.RetryScheduler(
+            max_attempts=6,
+            max_total_delay=20,
+            retry_on=(ipy.errors.HTTPException,),
+            should_retry=greeting_should_retry,
+        )
+        self.idle_threads = idle_index.IdleIndex(
+            float(os.environ.get("HELP_THREAD_IDLE_HOURS", "72")) * 3600
+        )
+        self.idle_wakeup = asyncio.Event()
+        # rapid clicks on the tag select get merged into one edit
+        self.post_edits = post_edits.PostEditBatcher(debounce=1.5)
+        self.archive_task: asyncio.Task | None = None
+        # threads that are known to already have had their first reply
+        self.replied_threads: set[int] = set()
         asyncio.create_task(self.fill_help_channel())
 
+    def drop(self) -> None:
+        if self.archive_task:
+            self.archive_task.cancel()
+        return super().drop()
+
     async def fill_help_channel(self):
         await self.bot.wait_until_ready()
         self.help_channel = await self.bot.fetch_channel(1040468265002090536)  # type: ignore
 
+        for post in await self.help_channel.fetch_posts():
+            if post.archived:
+                continue
+
+            last_active = (
+                ipy.Timestamp.from_snowflake(post.last_message_id)
+                if post.last_message_id
+                else post.created_at
+            )
+            self.idle_threads.touch(int(post.id), last_active.timestamp())
+
+        self.archive_task = asyncio.create_task(self.archive_idle_threads())
+
+    def is_help_thread(self, channel: ipy.BaseChannel | None) -> bool:
+        return (
+            isinstance(channel, ipy.GuildForumPost)
+            and int(channel.parent_id) == 1040468265002090536
+        )
+
+    def mark_active(self, thread_id: ipy.Snowflake_Type) -> None:
+        if self.idle_threads.touch(int(thread_id)):
+            self.idle_wakeup.set()
+
+    async def archive_idle_threads(self):
+        # sleeps until the next thread goes idle, or until a thread that goes
+        # idle even sooner shows up
+        while True:
+            self.idle_wakeup.clear()
+            deadline = self.idle_threads.next_deadline()
+            timeout = None if deadline is None else max(deadline - time.time(), 0)
+
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self.idle_wakeup.wait(), timeout)
+
+            for thread_id in self.idle_threads.pop_expired():
+                try:
+                    await self.archive_idle_thread(thread_id)
+                except Exception as e:
+                    await utils.error_handle(self.bot, e)
+
+    async def archive_idle_thread(self, thread_id: int):
+        thread = await self.bot.fetch_channel(thread_id)
+        if not self.is_help_thread(thread) or thread.archived or thread.locked:  # type: ignore
+            return
+
+        await thread.send(  # type: ignore
+            "Closing this thread due to inactivity. Feel free to make a new post if"
+            " you still need help!"
+        )
+        await self.close_thread(thread, idle=True)
+
+    async def close_thread(self, thread: ipy.GuildForumPost, *, idle: bool = False):
+        self.idle_threads.forget(int(thread.id))
+        self.replied_threads.discard(int(thread.id))
+
+        # tags can't be changed once the thread is archived, so this has to
+        # happen at the same time - this also picks up any pending tag changes
+        await self.post_edits.edit(
+            thread, add_tags=[self.solved_tag], archived=True, locked=True, delay=0
+        )
+
+        # metrics are done last, and failing to record them shouldn't matter
+        # to whoever closed the thread
+        try:
+            await self.record_thread_closed(thread, idle)
+        except Exception as e:
+            await utils.error_handle(self.bot, e)
+
+    @ipy.listen("message_create")
+    async def track_thread_activity(self, event: ipy.events.MessageCreate):
+        message = event.message
+        if message.author.id == self.bot.user.id:
+            return
+
+        if int(message._channel_id) in self.idle_threads or self.is_help_thread(
+            message.channel
+        ):
+            self.mark_active(message._channel_id)
+
+            thread: ipy.GuildForumPost = message.channel  # type: ignore
+            if (
+                int(thread.id) not in self.replied_threads
+                and message.author.id != thread.owner_id
+                and not message.author.bot
+            ):
+                self.replied_threads.add(int(thread.id))
+                await self.record_first_reply(thread, message)
+
+    @ipy.listen("thread_update")
+    async def untrack_archived_thread(self, event: ipy.events.ThreadUpdate):
+        if event.thread.archived:
+            self.idle_threads.forget(int(event.thread.id))
+            self.replied_threads.discard(int(event.thread.id))
+
+    @ipy.listen("thread_delete")
+    async def untrack_deleted_thread(self, event: ipy.events.ThreadDelete):
+        self.idle_threads.forget(int(event.thread.id))
+        self.replied_threads.discard(int(event.thread.id))
+
+    def metric_scopes(self, thread: ipy.GuildForumPost) -> list[str]:
+        return [
+            "all",
+            f"week:{week_of(thread.created_at)}",
+            *(
+                f"tag:{tag.id}"
+                for tag in thread.applied_tags
+                if int(tag.id) != self.solved_tag
+            ),
+        ]
+
+    async def record_duration(
+        self, metric: str, thread: ipy.GuildForumPost, seconds: float
+    ):
+        # one HINCRBY per scope, no matter how many threads there have been
+        bucket = METRICS_SKETCH.bucket(seconds)
+        async with self.bot.redis.pipeline() as pipe:
+            for scope in self.metric_scopes(thread):
+                key = f"{METRICS_KEY}:{metric}:{scope}"
+                pipe.hincrby(key, str(bucket), 1)
+                if scope.startswith("week:"):
+                    pipe.expire(key, METRICS_EXPIRY)
+            await pipe.execute()
+
+    @ipy.listen("new_thread_create")
+    async def record_thread_created(self, event: ipy.events.NewThreadCreate):
+        thread = event.thread
+        if not self.is_help_thread(thread) or thread.owner_id == self.bot.user.id:
+            return
+
+        thread_key = f"{METRICS_KEY}:thread:{thread.id}"
+        async with self.bot.redis.pipeline() as pipe:
+            pipe.hset(thread_key, "created", thread.created_at.timestamp())
+            pipe.expire(thread_key, METRICS_EXPIRY)
+            pipe.hincrby(f"{METRICS_KEY}:created", week_of(thread.created_at), 1)
+            await pipe.execute()
+
+    async def record_first_reply(
+        self, thread: ipy.GuildForumPost, message: ipy.Message
+    ):
+        thread_key = f"{METRICS_KEY}:thread:{thread.id}"
+        # this is only a fallback for after a restart, replied_threads stops
+        # this from running for every message
+        if not await self.bot.redis.hsetnx(
+            thread_key, "first_reply", message.created_at.timestamp()
+        ):
+            return
+
+        await self.bot.redis.expire(thread_key, METRICS_EXPIRY)
+        await self.record_duration(
+            "first_reply",
+            thread,
+            (message.created_at - thread.created_at).total_seconds(),
+        )
+
+    async def record_thread_closed(self, thread: ipy.GuildForumPost, idle: bool):
+        now = datetime.datetime.now(datetime.timezone.utc)
+        thread_key = f"{METRICS_KEY}:thread:{thread.id}"
+
+        async with self.bot.redis.pipeline() as pipe:
+            pipe.hset(thread_key, "closed", now.timestamp())
+            pipe.expire(thread_key, METRICS_EXPIRY)
+            if idle:
+                # idle threads weren't really resolved, so they'd only skew things
+                pipe.hincrby(
+                    f"{METRICS_KEY}:auto_archived", week_of(thread.created_at), 1
+                )
+            await pipe.execute()
+
+        if not idle:
+            await self.record_duration(
+                "resolution", thread, (now - thread.created_at).total_seconds()
+            )
+
+    @prefixed.prefixed_command(aliases=["help-metrics"])
+    @ipy.check(ipy.is_owner())
+    async def help_metrics(self, ctx: prefixed.PrefixedContext):
+        now = datetime.datetime.now(datetime.timezone.utc)
+        weeks = [
+            week_of(now - datetime.timedelta(weeks=i)) for i in range(METRICS_WEEKS)
+        ]
+        tags = {
+            int(tag.id): tag.name
+            for tag in self.help_channel.available_tags
+            if int(tag.id) != self.solved_tag
+        }
+        scopes = {
+            "all": "All Threads",
+            **{f"tag:{tag_id}": f"Tag: {name}" for tag_id, name in tags.items()},
+            **{f"week:{week}": f"Week {week}" for week in weeks},
+        }
+
+        async with self.bot.redis.pipeline() as pipe:
+            pipe.hgetall(f"{METRICS_KEY}:created")
+            pipe.hgetall(f"{METRICS_KEY}:auto_archived")
+            for scope in scopes:
+                pipe.hgetall(f"{METRICS_KEY}:first_reply:{scope}")
+                pipe.hgetall(f"{METRICS_KEY}:resolution:{scope}")
+            created, auto_archived, *sketches = await pipe.execute()
+
+        fields: list[tuple[str, str]] = []
+        for index, (scope, name) in enumerate(scopes.items()):
+            first_reply, resolution = sketches[index * 2 : index * 2 + 2]
+            if scope != "all" and not first_reply and not resolution:
+                continue
+
+            lines: list[str] = []
+            if scope.startswith("week:"):
+                week = scope.removeprefix("week:")
+                lines.append(
+                    f"Created: {created.get(week, 0)} | Auto-archived:"
+                    f" {auto_archived.get(week, 0)}"
+                )
+
+            for label, counts in (
+                ("First reply", first_reply),
+                ("Resolved", resolution),
+            ):
+                quantiles = METRICS_SKETCH.quantiles(counts, METRICS_QUANTILES)
+                if quantiles[0] is None:
+                    lines.append(f"{label}: no data")
+                    continue
+
+                formatted = " / ".join(format_duration(q) for q in quantiles)  # type: ignore
+                lines.append(
+                    f"{label} (p50 / p90 / p99): {formatted}"
+                    f" ({METRICS_SKETCH.count(counts)} threads)"
+                )
+
+            fields.append((name, "\n".join(lines)))
+
+        embed = ipy.Embed(title="Help Forum Metrics", color=self.bot.color)
+        for embeds in utils.fit_embed_messages(embed, fields=fields):
+            await ctx.reply(embeds=embeds)
+
     def generate_tag_select(self, channel: ipy.GuildForum):
         tags = channel.available_tags
+        key = tuple(int(tag.id) for tag in tags)
+        if select := self.tag_select_cache.get(key):
+            return select
+
         options: list[ipy.StringSelectOption] = []
 
         for tag in tags:
@@ -37,13 +341,22 @@ class HelpForum(ipy.Extension):
                 ipy.StringSelectOption(label=tag.name, value=str(tag.id), emoji=emoji)
             )
 
-        return ipy.StringSelectMenu(
+        select = ipy.StringSelectMenu(
             *options,
             placeholder="Add/Remove Tags (Admin Only)",
             min_values=1,
             max_values=len(options),
             custom_id="modify_tags",
         )
+        self.tag_select_cache[key] = select
+        return select
+
+    @ipy.listen("channel_update")
+    async def invalidate_tag_select(self, event: ipy.events.ChannelUpdate):
+        # a tag could have been renamed or had its emoji changed without its
+        # id changing, so just start over
+        if int(event.after.id) == 1040468265002090536:
+            self.tag_select_cache.clear()
 
     @ipy.listen("new_thread_create")
     async def first_message_for_help(self, event: ipy.events.NewThreadCreate):
@@ -55,6 +368,7 @@ class HelpForum(ipy.Extension):
             # an autogenerated thread, don't interfere
             return
 
+        self.mark_active(thread.id)
         select = self.generate_tag_select(thread.parent_channel)
         close_button = ipy.Button(
             style=ipy.ButtonStyle.DANGER,
@@ -63,29 +377,25 @@ class HelpForum(ipy.Extension):
         )
 
         try:
-            message = await thread.send(
-                (
-                    "Thank you for using the help system! Please wait for someone to"
-                    " help you.\nOnce your issue is solved, press the button below to"
-                    " close this thread."
-                ),
-                components=[[select], [close_button]],
-            )
-        except ipy.errors.HTTPException:
-            # this tends to happen often if the "thread author has not sent their initial message"
+            # this tends to fail often with "thread author has not sent their initial message"
             # techically, they already did because you can't make a thread otherwise...
-            # so we're just waiting for discord to get the memo
-            await asyncio.sleep(5)
-            message = await thread.send(
+            # so we're just waiting for discord to get the memo, which usually
+            # only takes a second or so
+            message = await self.greeting_retry.run(
+                thread.send,
                 (
                     "Thank you for using the help system! Please wait for someone to"
                     " help you.\nOnce your issue is solved, press the button below to"
                     " close this thread."
                 ),
                 components=[[select], [close_button]],
+                name=f"help greeting for {thread.id}",
             )
-
-        await message.pin()
+            await self.greeting_retry.run(
+                message.pin, name=f"help greeting pin for {thread.id}"
+            )
+        except ipy.errors.HTTPException as e:
+            await utils.error_handle(self.bot, e)
 
     @ipy.component_callback("modify_tags")
     async def modify_tags(self, ctx: ipy.ComponentContext):
@@ -100,17 +410,7 @@ class HelpForum(ipy.Extension):
         await ctx.defer(ephemeral=True)
 
         channel: ipy.GuildForumPost = ctx.channel  # type: ignore
-
-        current_tags = {int(t.id) for t in channel.applied_tags}
-
-        for tag_id in ctx.values:
-            if int(tag_id) in current_tags:
-                current_tags.remove(int(tag_id))
-            else:
-                current_tags.add(int(tag_id))
-
-        tags = [int(v) for v in ctx.values]
-        await channel.edit(applied_tags=tags)
+        await self.post_edits.edit(channel, toggle_tags=ctx.values)
         await ctx.send("Done!", ephemeral=True)
 
     @ipy.component_callback("close_thread")  # type: ignore
@@ -124,14 +424,10 @@ class HelpForum(ipy.Extension):
             )
 
         await ctx.send("Closing. Thank you for using our help system!")
-
-        if self.solved_tag not in ctx.channel.applied_tags:
-            await ctx.channel.edit(
-                applied_tags=[self.solved_tag] + ctx.channel.applied_tags
-            )
-        await ctx.channel.edit(archived=True, locked=True)
+        await self.close_thread(ctx.channel)  # type: ignore
 
 
 def setup(bot):
-    importlib.reload(utils)
+    if not bot.init_load:
+        importlib.reload(utils)
     HelpForum(bot)
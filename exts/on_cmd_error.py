@@ -45,5 +45,6 @@ class OnCMDError(ipy.Extension):
 
 
 def setup(bot: utils.SLBotBase) -> None:
-    importlib.reload(utils)
+    if not bot.init_load:
+        importlib.reload(utils)
     OnCMDError(bot)
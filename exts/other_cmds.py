@@ -120,5 +120,6 @@ class OtherCMDs(utils.Extension):
 
 
 def setup(bot):
-    importlib.reload(utils)
+    if not bot.init_load:
+        importlib.reload(utils)
     OtherCMDs(bot)
@@ -43,11 +43,23 @@ class OwnerCMDs(ipy.Extension):
         ]:
             e.add_field("Privileged Intents", " | ".join(privileged_intents))
 
-        e.add_field("Loaded Extensions", ", ".join(self.bot.ext))
-
-        e.add_field("Guilds", str(len(self.bot.guilds)))
-
-        await ctx.reply(embeds=[e])
+        # this one can get long, so let it be truncated instead of erroring
+        fields = [
+            ("Loaded Extensions", ", ".join(self.bot.ext)),
+            ("Guilds", str(len(self.bot.guilds))),
+            (
+                "Owner Notifications",
+                (
+                    f"{self.bot.owner_notifier.depth} queued |"
+                    f" {self.bot.owner_notifier.sent} sent |"
+                    f" {self.bot.owner_notifier.merged} merged |"
+                    f" {self.bot.owner_notifier.dropped} dropped"
+                ),
+            ),
+        ]
+
+        for embeds in utils.fit_embed_messages(e, fields=fields):
+            await ctx.reply(embeds=embeds)
 
     @debug.subcommand(aliases=["cache"])
     async def cache_info(self, ctx: prefixed.PrefixedContext) -> None:
@@ -57,6 +69,28 @@ class OwnerCMDs(ipy.Extension):
         e.description = f"```prolog\n{get_cache_state(self.bot)}\n```"
         await ctx.reply(embeds=[e])
 
+    @debug.subcommand(aliases=["boot"])
+    async def startup(self, ctx: prefixed.PrefixedContext) -> None:
+        """Get how long each extension took to load on startup."""
+        report = self.bot.startup_report
+        e = debug_embed("Startup")
+
+        rows = [f"{'extension':<28}{'import':>9}{'setup':>9}"]
+        rows.extend(
+            f"{ext.name:<28}{ext.import_time * 1000:>7.1f}ms{ext.setup_time * 1000:>7.1f}ms"
+            for ext in sorted(report.extensions, key=lambda e: e.total, reverse=True)
+        )
+        e.description = "```prolog\n" + "\n".join(rows) + "\n```"
+
+        fields = [
+            ("Discovery", f"{report.discovery_time * 1000:.1f}ms"),
+            ("Imports", f"{report.import_time * 1000:.1f}ms"),
+            ("Setup", f"{report.setup_time * 1000:.1f}ms"),
+            ("Total", f"{report.total * 1000:.1f}ms"),
+        ]
+        for embeds in utils.fit_embed_messages(e, fields=fields):
+            await ctx.reply(embeds=embeds)
+
     @debug.subcommand()
     async def shutdown(self, ctx: prefixed.PrefixedContext) -> None:
         """Shuts down the bot."""
@@ -269,21 +303,9 @@ class OwnerCMDs(ipy.Extension):
                 await ctx.send("Nice try.")
             return
 
-        error_str = utils.error_format(error)
-        chunks = utils.line_split(error_str)
-
-        for i in range(len(chunks)):
-            chunks[i][0] = f"```py\n{chunks[i][0]}"
-            chunks[i][len(chunks[i]) - 1] += "\n```"
-
-        final_chunks = ["\n".join(chunk) for chunk in chunks]
-        if ctx and hasattr(ctx, "message") and hasattr(ctx.message, "jump_url"):
-            final_chunks.insert(0, f"Error on: {ctx.message.jump_url}")
-
-        to_send = final_chunks
-        split = False
-
-        await utils.msg_to_owner(self.bot, to_send, split)
+        # the owner just ran the command, so they want to see the error every
+        # time - besides, errors from exec/eval all look alike to the digest
+        utils.report_error(self.bot, error, ctx, skip_digest=True)
 
         if hasattr(ctx, "send"):
             await ctx.send("An error occured. Please check your DMs.")
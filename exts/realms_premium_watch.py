@@ -7,6 +7,8 @@ import interactions as ipy
 from interactions.ext import prefixed_commands as prefixed
 
 import common.models as models
+import common.premium_sync as premium_sync
+import common.role_queue as role_queue
 import common.utils as utils
 
 PREMIUM_REMOVE_MESSAGE = """
@@ -31,6 +33,10 @@ class RealmsPremiumWatch(utils.Extension):
         self.bot: utils.SLBotBase = bot
         self.premium_role: ipy.Role = None  # type: ignore
         self.supporter_role: ipy.Role = None  # type: ignore
+        self.reconciler = premium_sync.PremiumReconciler()
+        self.reconciler.register_listeners()
+        self.membership = premium_sync.PremiumMembershipIndex(self.bot.redis)
+        self.membership.register_listeners()
 
         asyncio.create_task(self.async_run())
 
@@ -38,28 +44,112 @@ class RealmsPremiumWatch(utils.Extension):
         await self.bot.fully_ready.wait()
         self.premium_role = await self.bot.guild.fetch_role(1007868499772846081)  # type: ignore
         self.supporter_role = await self.bot.guild.fetch_role(987447832715857961)  # type: ignore
+        # the redis copy may be stale, so always start from the database
+        await self.membership.rebuild()
+
+        # do one full pass on startup - after that, we only need to look at
+        # members whose state changed
+        await self.update_roles()
+        self.reconcile_roles.start()
+        self.refresh_membership.start()
         self.update_roles.start()
 
     def drop(self) -> None:
+        self.reconcile_roles.stop()
+        self.refresh_membership.stop()
         self.update_roles.stop()
+        self.reconciler.unregister_listeners()
+        self.membership.unregister_listeners()
         return super().drop()
 
+    def _should_remove(
+        self, member: ipy.Member, filter_time: datetime.datetime
+    ) -> bool:
+        if self.reconciler.is_synced(member.id):
+            return False
+
+        if self.reconciler.is_deferred(int(member.id)):
+            # still in their grace period, ie they just got the role
+            return False
+
+        if member.joined_at >= filter_time:
+            # give them some time to get their code, but look at them again later
+            self.reconciler.defer(
+                member.id, member.joined_at + datetime.timedelta(days=3)
+            )
+            return False
+
+        return True
+
+    async def _remove_premium_roles(
+        self, members: list[ipy.Member], name: str
+    ) -> role_queue.RoleQueueReport:
+        # with contextlib.suppress(ipy.errors.HTTPException):
+        #     await member.send(PREMIUM_REMOVE_MESSAGE)
+        return await self.bot.role_queue.run_batch(
+            (
+                role_queue.RoleJob(member, (int(self.premium_role.id),), False)
+                for member in members
+            ),
+            name=name,
+        )
+
+    @ipy.Task.create(ipy.IntervalTrigger(minutes=5))
+    async def refresh_membership(self):
+        # paid codes are made by another process, so we never get signals for
+        # them - a rebuild is a single query over the paid codes only
+        await self.membership.rebuild()
+
+    @ipy.Task.create(ipy.IntervalTrigger(minutes=5))
+    async def reconcile_roles(self):
+        dirty_ids = self.reconciler.pop_dirty()
+        if not dirty_ids:
+            return
+
+        await self.reconciler.refresh(dirty_ids)
+        filter_time = ipy.Timestamp.utcnow() - datetime.timedelta(days=3)
+
+        to_remove: list[ipy.Member] = []
+        for user_id in dirty_ids:
+            member = self.bot.guild.get_member(user_id)
+            if (
+                member
+                and member.has_role(self.premium_role)
+                and self._should_remove(member, filter_time)
+            ):
+                to_remove.append(member)
+
+        if to_remove:
+            await self._remove_premium_roles(to_remove, "premium reconcile")
+
     @ipy.Task.create(ipy.IntervalTrigger(hours=12))
     async def update_roles(self):
+        # a full consistency check, in case something was missed by
+        # the incremental reconciliation, ie codes changed by another process
         filter_time = ipy.Timestamp.utcnow() - datetime.timedelta(days=3)
 
         self.premium_role: ipy.Role = await self.bot.guild.fetch_role(1007868499772846081)  # type: ignore
-
-        values = await models.PremiumCode.all().values("user_id")
-        synced_member_ids: set[int] = {
-            int(value["user_id"]) for value in values if value["user_id"] is not None
-        }
-
-        for member in self.premium_role.members:
-            if member.id not in synced_member_ids and member.joined_at < filter_time:
-                await member.remove_role(self.premium_role)
-                # with contextlib.suppress(ipy.errors.HTTPException):
-                #     await member.send(PREMIUM_REMOVE_MESSAGE)
+        await self.reconciler.full_load()
+        await self.membership.rebuild()
+
+        to_remove = [
+            member
+            for member in self.premium_role.members
+            if self._should_remove(member, filter_time)
+        ]
+        await self._remove_premium_roles(to_remove, "premium sweep")
+
+    async def revoke_user_codes(self, user_id: int) -> premium_sync.RevokeResult:
+        code_ids = await models.PremiumCode.filter(
+            user_id=user_id,
+            customer_id__isnull=True,
+        ).values_list("id", flat=True)
+        if not code_ids:
+            return premium_sync.RevokeResult(0, 0)
+
+        result = await premium_sync.revoke_codes(code_ids)  # type: ignore
+        self.reconciler.code_removed(user_id)
+        return result
 
     @ipy.listen()
     async def on_member_update(self, event: ipy.events.MemberUpdate):
@@ -69,53 +159,43 @@ class RealmsPremiumWatch(utils.Extension):
         if event.before._role_ids == event.after._role_ids:
             return
 
+        if not event.before.has_role(self.premium_role) and event.after.has_role(
+            self.premium_role
+        ):
+            # give them the same grace period as new members to get their code
+            self.reconciler.defer(
+                int(event.after.id),
+                ipy.Timestamp.utcnow() + datetime.timedelta(days=3),
+            )
+
         if event.before.has_role(self.premium_role) and not event.after.has_role(
             self.premium_role
         ):
-            code = await models.PremiumCode.get_or_none(
-                user_id=int(event.before.id),
-                customer_id__isnull=True,
-            ).prefetch_related("guilds")
-            if code:
-                for config in code.guilds:
-                    config.premium_code = None
-                    config.live_playerlist = False
-                    config.fetch_devices = False
-                    config.live_online_channel = None
-                    await config.save()
-                await code.delete()
+            await self.revoke_user_codes(int(event.before.id))
 
     @ipy.listen()
     async def on_member_add(self, event: ipy.events.MemberAdd):
         if not self.premium_role:
             return
 
-        if await models.PremiumCode.exists(
-            user_id=int(event.member.id),
-            customer_id__not_isnull=True,
-        ):
-            await event.member.add_roles((self.premium_role, self.supporter_role))
+        if await self.membership.contains(int(event.member.id)):
+            await self.bot.role_queue.add(
+                event.member, self.premium_role, self.supporter_role
+            )
+
+        self.reconciler.mark_dirty(int(event.member.id))
 
     @ipy.listen()
     async def on_member_remove(self, event: ipy.events.MemberRemove):
         if not self.premium_role:
             return
 
+        self.reconciler.forget(int(event.member.id))
+
         if not isinstance(event.member, ipy.Member) or event.member.has_role(
             self.premium_role
         ):
-            code = await models.PremiumCode.get_or_none(
-                user_id=int(event.member.id),
-                customer_id__isnull=True,
-            ).prefetch_related("guilds")
-            if code:
-                for config in code.guilds:
-                    config.premium_code = None
-                    config.live_playerlist = False
-                    config.fetch_devices = False
-                    config.live_online_channel = None
-                    await config.save()
-                await code.delete()
+            await self.revoke_user_codes(int(event.member.id))
 
     @prefixed.prefixed_command(aliases=["resync-premium"])
     @ipy.check(ipy.is_owner())
@@ -128,24 +208,37 @@ class RealmsPremiumWatch(utils.Extension):
             member_ids = [member.id for member in self.premium_role.members]
             member_ids.append(self.bot.owner.id)
 
-            async for code in models.PremiumCode.filter(
+            codes = await models.PremiumCode.filter(
                 user_id__not_in=member_ids,
+                user_id__not_isnull=True,
                 customer_id__isnull=True,
-            ).prefetch_related("guilds"):
-                if code.user_id is None:
-                    continue
+            ).values_list("id", "user_id")
+
+            result = await premium_sync.revoke_codes(code[0] for code in codes)
+            for _, user_id in codes:
+                self.reconciler.code_removed(user_id)
 
-                for config in code.guilds:
-                    config.premium_code = None
-                    config.live_playerlist = False
-                    config.fetch_devices = False
-                    config.live_online_channel = None
-                    await config.save()
-                await code.delete()
+        await ctx.reply(
+            f"Done! Revoked {result.codes_deleted} code(s) and reset"
+            f" {result.configs_updated} server config(s)."
+        )
+
+    @prefixed.prefixed_command(aliases=["premium-index"])
+    @ipy.check(ipy.is_owner())
+    async def premium_index(self, ctx: prefixed.PrefixedContext, rebuild: bool = False):
+        if rebuild:
+            async with ctx.channel.typing:
+                await self.membership.invalidate()
+                await self.membership.rebuild()
 
-        await ctx.reply("Done!")
+        await ctx.reply(
+            f"Indexed users: {len(self.membership.user_ids)}\n"
+            f"Hits: {self.membership.hits} | Misses: {self.membership.misses}"
+            f" ({self.membership.hit_rate:.1%} hit rate)"
+        )
 
 
 def setup(bot):
-    importlib.reload(utils)
+    if not bot.init_load:
+        importlib.reload(utils)
     RealmsPremiumWatch(bot)
@@ -1,15 +1,105 @@
 import asyncio
 import datetime
+import hmac
 import importlib
 import os
+import time
+import typing
 
 import interactions as ipy
 import orjson
 from aiohttp import web
+from interactions.ext import prefixed_commands as prefixed
+from redis.exceptions import NoScriptError
 
+import common.stream_queue as stream_queue
 import common.utils as utils
 
 TWELVE_HOURS = int(datetime.timedelta(hours=12).total_seconds())
+DEDUPE_TTL = int(datetime.timedelta(hours=6).total_seconds())
+# mentions are around 22 characters each, so this keeps us well under 2000
+PINGS_PER_MESSAGE = 75
+
+# a streak is kept going as long as the next vote is within this many seconds
+STREAK_WINDOW = int(datetime.timedelta(hours=36).total_seconds())
+BOT_NAMES = {
+    725483868777611275: "Realms Playerlist Bot",
+    843994199187914753: "Ultimate Investigator",
+}
+
+# the fields each webhook needs, and what they should be converted to
+WEBHOOK_FIELDS: dict[str, dict[str, typing.Callable[[typing.Any], typing.Any]]] = {
+    "/topgg": {"user": int, "bot": int, "type": str},
+    "/dbl_rpl": {"id": int, "username": str},
+    "/dbl_ui": {"id": int, "username": str},
+}
+
+STATS_PERIODS = {
+    "hour": int(datetime.timedelta(hours=1).total_seconds()),
+    "day": int(datetime.timedelta(days=1).total_seconds()),
+    "week": int(datetime.timedelta(weeks=1).total_seconds()),
+}
+
+
+def stats_keys(period: str, length: int, timestamp: float) -> tuple[str, str]:
+    bucket = int(timestamp // length)
+    return (
+        f"slbot-vote-stats-{period}-{bucket}",
+        f"slbot-vote-uniques-{period}-{bucket}",
+    )
+
+
+# bumps the user's streak for a bot and records their best streak, returning
+# the streak - only the first vote for the bot in a 12 hour period counts, so
+# voting on more than one site doesn't inflate it
+# KEYS[1] = the user's streak key, KEYS[2] = the user's "already counted" key,
+# KEYS[3] = best streaks zset
+# ARGV[1] = user id, ARGV[2] = streak window in seconds, ARGV[3] = period in seconds
+STREAK_SCRIPT = """
+if not redis.call("SET", KEYS[2], "1", "NX", "EX", ARGV[3]) then
+    return tonumber(redis.call("GET", KEYS[1]) or "0")
+end
+local streak = redis.call("INCR", KEYS[1])
+redis.call("EXPIRE", KEYS[1], ARGV[2])
+local best = tonumber(redis.call("ZSCORE", KEYS[3], ARGV[1]) or "0")
+if streak > best then
+    redis.call("ZADD", KEYS[3], streak, ARGV[1])
+end
+return streak
+""".strip()
+
+
+class VoteAnnouncement(typing.NamedTuple):
+    username: str
+    user_id: int
+    bot_id: int
+    site_name: str
+    vote_url: str
+    got_role: bool
+
+
+class VoterInfo(typing.NamedTuple):
+    # only kept for voters outside the server - members are in the gateway cache
+    display: typing.Optional[str]
+
+
+class WebhookConfig(typing.NamedTuple):
+    host: str
+    port: int
+    backlog: int
+    keepalive: float
+    max_body_size: int
+
+    @classmethod
+    def from_env(cls) -> "WebhookConfig":
+        return cls(
+            host=os.environ.get("VOTE_WEBHOOK_HOST", "127.0.0.1"),
+            port=int(os.environ.get("VOTE_WEBHOOK_PORT", "8000")),
+            backlog=int(os.environ.get("VOTE_WEBHOOK_BACKLOG", "128")),
+            keepalive=float(os.environ.get("VOTE_WEBHOOK_KEEPALIVE", "75")),
+            # vote payloads are tiny, so there's no reason to accept anything big
+            max_body_size=int(os.environ.get("VOTE_WEBHOOK_MAX_BODY", "4096")),
+        )
 
 
 class VoteHandling(ipy.Extension):
@@ -19,144 +109,592 @@ class VoteHandling(ipy.Extension):
         self.bot_vote_channel: ipy.GuildText = None  # type: ignore
         self.runner: web.AppRunner = None  # type: ignore
         self.bot_vote_role: int = 1122748827649192027
+        self.webhook_config = WebhookConfig.from_env()
+        self.webhook_auth: dict[str, bytes] = {
+            "/topgg": os.environ["TOPGG_AUTH"].encode(),
+            "/dbl_rpl": os.environ["DBL_AUTH"].encode(),
+            "/dbl_ui": os.environ["DBL_AUTH"].encode(),
+        }
+        # /stats is only served when it can be locked behind its own auth
+        if stats_auth := os.environ.get("VOTE_STATS_AUTH"):
+            self.webhook_auth["/stats"] = stats_auth.encode()
+        self.vote_queue = stream_queue.StreamQueue(
+            self.bot.redis,
+            "slbot-votes",
+            self.process_vote,
+            on_dead=self.vote_failed,
+        )
+
+        # votes that come in within this many seconds of the last announcement are
+        # gathered up and sent as one, so bursts don't hit the channel's ratelimit
+        self.announce_window = float(os.environ.get("VOTE_ANNOUNCE_WINDOW", "10"))
+        self.pending_announcements: list[VoteAnnouncement] = []
+        self.announce_task: typing.Optional[asyncio.Task] = None
+        self.last_announce: float = 0.0
+
+        self.duplicate_votes = 0
+
+        # repeat voters vote every 12 hours - no need to ask discord who they are
+        # every time if they aren't in the server
+        self.voter_cache: utils.TTLCache[int, VoterInfo] = utils.TTLCache(
+            maxsize=10000, ttl=datetime.timedelta(hours=6).total_seconds()
+        )
+
+        # loaded on startup, so recording a vote can queue evalsha directly
+        # rather than have the pipeline check for the script every time
+        self.streak_sha: str = None  # type: ignore
 
         asyncio.create_task(self.fill_topgg_info())
 
     def drop(self) -> None:
+        self.vote_queue.stop()
+        if self.announce_task:
+            self.announce_task.cancel()
         asyncio.create_task(self.runner.cleanup())
         return super().drop()
 
     async def fill_topgg_info(self):
         await self.bot.fully_ready.wait()
         self.bot_vote_channel = await self.bot.fetch_channel(1122755262466498590)  # type: ignore
+        self.streak_sha = await self.bot.redis.script_load(STREAK_SCRIPT)
+        await self.vote_queue.start()
 
-        app = web.Application()
-        app.add_routes(
-            [
-                web.post("/topgg", self.topgg_handling),
-                web.post("/dbl_rpl", self.dbl_handling_rpl),
-                web.post("/dbl_ui", self.dbl_handling_ui),
-            ]
+        self.runner = web.AppRunner(
+            self.create_app(), keepalive_timeout=self.webhook_config.keepalive
         )
-        self.runner = web.AppRunner(app)
         await self.runner.setup()
-        site = web.TCPSite(self.runner, "127.0.0.1", 8000)
+        site = web.TCPSite(
+            self.runner,
+            self.webhook_config.host,
+            self.webhook_config.port,
+            backlog=self.webhook_config.backlog,
+        )
         await site.start()
 
-    async def topgg_handling(
+    def create_app(self) -> web.Application:
+        app = web.Application(
+            middlewares=[self.webhook_guard],
+            client_max_size=self.webhook_config.max_body_size,
+        )
+        routes = [
+            web.post("/topgg", self.topgg_handling),
+            web.post("/dbl_rpl", self.dbl_handling_rpl),
+            web.post("/dbl_ui", self.dbl_handling_ui),
+        ]
+        if "/stats" in self.webhook_auth:
+            routes.append(web.get("/stats", self.stats_handling))
+
+        app.add_routes(routes)
+        return app
+
+    @web.middleware
+    async def webhook_guard(
         self,
         request: web.Request,
-    ):
-        authorization = request.headers.get("Authorization")
-        if not authorization or authorization != os.environ["TOPGG_AUTH"]:
+        handler: typing.Callable[[web.Request], typing.Awaitable[web.StreamResponse]],
+    ) -> web.StreamResponse:
+        # everything here is checked before the body is read, so bad requests
+        # cost us as little as possible
+        expected_auth = self.webhook_auth.get(request.path)
+        if expected_auth is None:
+            return await handler(request)
+
+        authorization = request.headers.get("Authorization", "")
+        if not hmac.compare_digest(authorization.encode(), expected_auth):
             return web.Response(status=401)
 
-        vote_data = await request.json(loads=orjson.loads)
-        user_id = int(vote_data["user"])
-        bot_id = int(vote_data["bot"])
+        if request.method != "POST":
+            return await handler(request)
 
-        if bot_id == 725483868777611275 and vote_data["type"] != "test":
-            _ = asyncio.create_task(
-                self.bot.redis.setex(f"rpl-voted-{user_id}", TWELVE_HOURS, "1")
-            )
+        if (
+            request.content_length is not None
+            and request.content_length > self.webhook_config.max_body_size
+        ):
+            return web.Response(status=413)
+        if (
+            "Content-Type" in request.headers
+            and request.content_type != "application/json"
+        ):
+            return web.Response(status=415)
 
-        __ = asyncio.create_task(
-            self.handle_vote(
-                f"<@{user_id}>",
-                user_id,
-                int(vote_data["bot"]),
-                "Top.gg",
-                "https://top.gg/bot/{bot_id}",
-            )
+        try:
+            vote_data = await request.json(loads=orjson.loads)
+            for field, convert in WEBHOOK_FIELDS.get(request.path, {}).items():
+                vote_data[field] = convert(vote_data[field])
+        except web.HTTPRequestEntityTooLarge:
+            return web.Response(status=413)
+        except (ValueError, KeyError, TypeError):
+            # invalid json, or json without the fields we need
+            return web.Response(status=400)
+
+        request["vote_data"] = vote_data
+        try:
+            return await handler(request)
+        except web.HTTPException:
+            raise
+        except Exception as e:
+            # our fault rather than the site's, so let them retry it
+            await utils.error_handle(self.bot, e)
+            return web.Response(status=500)
+
+    async def stats_handling(self, request: web.Request):
+        # a fixed amount of redis reads, no matter how many votes there have been
+        now = time.time()
+
+        async with self.bot.redis.pipeline(transaction=False) as pipe:
+            for period, length in STATS_PERIODS.items():
+                counts_key, uniques_key = stats_keys(period, length, now)
+                pipe.hgetall(counts_key)
+                pipe.pfcount(uniques_key)
+            results = await pipe.execute()
+
+        stats: dict[str, typing.Any] = {}
+        for index, (period, length) in enumerate(STATS_PERIODS.items()):
+            counts: dict[str, str] = results[index * 2]
+            stats[period] = {
+                "since": int(now // length) * length,
+                "total": int(counts.get("total", 0)),
+                "bots": {
+                    k.removeprefix("bot:"): int(v)
+                    for k, v in counts.items()
+                    if k.startswith("bot:")
+                },
+                "sites": {
+                    k.removeprefix("site:"): int(v)
+                    for k, v in counts.items()
+                    if k.startswith("site:")
+                },
+                "unique_voters": results[index * 2 + 1],
+            }
+
+        return web.Response(body=orjson.dumps(stats), content_type="application/json")
+
+    async def topgg_handling(
+        self,
+        request: web.Request,
+    ):
+        vote_data = request["vote_data"]
+        user_id: int = vote_data["user"]
+        bot_id: int = vote_data["bot"]
+
+        is_test = vote_data["type"] == "test"
+
+        await self.enqueue_vote(
+            f"<@{user_id}>",
+            user_id,
+            bot_id,
+            "Top.gg",
+            "https://top.gg/bot/{bot_id}",
+            rpl_voted=bot_id == 725483868777611275 and not is_test,
+            dedupe=not is_test,
+            is_test=is_test,
         )
 
         return web.Response(status=200)
 
     async def dbl_handling_rpl(self, request: web.Request):
-        authorization = request.headers.get("Authorization")
-        if not authorization or authorization != os.environ["DBL_AUTH"]:
-            return web.Response(status=401)
-
-        vote_data = await request.json(loads=orjson.loads)
-        user_id = int(vote_data["id"])
+        vote_data = request["vote_data"]
+        user_id: int = vote_data["id"]
 
-        _ = asyncio.create_task(
-            self.bot.redis.setex(f"rpl-voted-{user_id}", TWELVE_HOURS, "1")
+        await self.enqueue_vote(
+            f"<@{user_id}> (**@{vote_data['username']})**",
+            user_id,
+            725483868777611275,
+            "Discord Bot List",
+            "https://discordbotlist.com/bots/realms-playerlist-bot",
+            rpl_voted=True,
         )
 
-        __ = asyncio.create_task(
-            self.handle_vote(
-                f"<@{user_id}> (**@{vote_data['username']})**",
-                user_id,
-                725483868777611275,
-                "Discord Bot List",
-                "https://discordbotlist.com/bots/realms-playerlist-bot",
-            )
+        return web.Response(status=200)
+
+    async def dbl_handling_ui(self, request: web.Request):
+        vote_data = request["vote_data"]
+        user_id: int = vote_data["id"]
+
+        await self.enqueue_vote(
+            f"<@{user_id}> (**@{vote_data['username']})**",
+            user_id,
+            843994199187914753,
+            "Discord Bot List",
+            "https://discordbotlist.com/bots/ultimate-investigator",
         )
 
         return web.Response(status=200)
 
-    async def dbl_handling_ui(self, request: web.Request):
-        authorization = request.headers.get("Authorization")
-        if not authorization or authorization != os.environ["DBL_AUTH"]:
-            return web.Response(status=401)
+    async def claim_vote(
+        self, site_name: str, bot_id: int, user_id: int
+    ) -> typing.Optional[str]:
+        # sites retry webhooks on timeouts, so make sure each vote is only
+        # handled once - returns the claim's key, or None if it's a duplicate
+        # votes can only happen every 12 hours, so a claim that expires sooner
+        # than that will never swallow a real vote
+        key = f"slbot-vote-claim-{site_name}-{bot_id}-{user_id}"
+
+        if await self.bot.redis.set(key, "1", nx=True, ex=DEDUPE_TTL):
+            return key
 
-        vote_data = await request.json(loads=orjson.loads)
-        user_id = int(vote_data["id"])
+        self.duplicate_votes += 1
+        await self.bot.redis.hincrby("slbot-vote-duplicates", site_name, 1)
+        return None
 
-        _ = asyncio.create_task(
-            self.handle_vote(
-                f"<@{user_id}> (**@{vote_data['username']})**",
-                user_id,
-                843994199187914753,
-                "Discord Bot List",
-                "https://discordbotlist.com/bots/ultimate-investigator",
+    async def enqueue_vote(
+        self,
+        username: str,
+        user_id: int,
+        bot_id: int,
+        site_name: str,
+        vote_url: str,
+        *,
+        rpl_voted: bool = False,
+        dedupe: bool = True,
+        is_test: bool = False,
+    ):
+        claim = None
+        if dedupe:
+            claim = await self.claim_vote(site_name, bot_id, user_id)
+            if not claim:
+                return
+
+        try:
+            if rpl_voted:
+                await self.bot.redis.setex(f"rpl-voted-{user_id}", TWELVE_HOURS, "1")
+
+            # votes are written to redis before we respond to the webhook, so they
+            # aren't lost if we restart or discord is having a bad time
+            await self.vote_queue.enqueue(
+                {
+                    "username": username,
+                    "user_id": user_id,
+                    "bot_id": bot_id,
+                    "site_name": site_name,
+                    "vote_url": vote_url,
+                    "is_test": "1" if is_test else "0",
+                }
+            )
+        except Exception:
+            # let the site's retry go through, since we never queued the vote
+            if claim:
+                await self.bot.redis.delete(claim)
+            raise
+
+    async def process_vote(self, fields: dict[str, str]):
+        if fields.get("announce_only"):
+            # an announcement that failed to send as part of a group - the vote
+            # itself was already handled, so only the announcement is retried
+            await self.send_single_announcement(
+                VoteAnnouncement(
+                    fields["username"],
+                    int(fields["user_id"]),
+                    int(fields["bot_id"]),
+                    fields["site_name"],
+                    fields["vote_url"],
+                    fields["got_role"] == "1",
+                )
             )
+            return
+
+        await self.handle_vote(
+            fields["username"],
+            int(fields["user_id"]),
+            int(fields["bot_id"]),
+            fields["site_name"],
+            fields["vote_url"],
+            is_test=fields.get("is_test") == "1",
         )
 
-        return web.Response(status=200)
+    async def vote_failed(self, fields: dict[str, str], error: Exception):
+        await utils.error_handle(self.bot, error)
 
     async def handle_vote(
-        self, username: str, user_id: int, bot_id: int, site_name: str, vote_url: str
+        self,
+        username: str,
+        user_id: int,
+        bot_id: int,
+        site_name: str,
+        vote_url: str,
+        *,
+        is_test: bool = False,
+    ):
+        got_role: bool = False
+
+        member, display = await self.resolve_voter(user_id)
+        if display:
+            username = display
+        if member and not member.has_role(self.bot_vote_role):
+            await self.bot.role_queue.add(member, self.bot_vote_role)
+            got_role = True
+
+        await self.announce_vote(
+            VoteAnnouncement(username, user_id, bot_id, site_name, vote_url, got_role)
+        )
+        # done last, so a vote that fails and gets retried isn't counted twice
+        # test votes are still announced, but shouldn't count for anything
+        if not is_test:
+            await self.record_vote(user_id, bot_id, site_name)
+
+    async def record_vote(self, user_id: int, bot_id: int, site_name: str) -> int:
+        # everything goes in one round trip, and none of it needs a scan to read
+        now = time.time()
+
+        async with self.bot.redis.pipeline(transaction=False) as pipe:
+            pipe.zincrby("slbot-vote-totals", 1, bot_id)
+            pipe.zincrby("slbot-vote-leaderboard", 1, user_id)
+            pipe.zincrby(f"slbot-vote-leaderboard-{bot_id}", 1, user_id)
+
+            # precomputed aggregates for /stats - one hash of counts and one
+            # hyperloglog of voters per period, each expiring after two periods
+            for period, length in STATS_PERIODS.items():
+                counts_key, uniques_key = stats_keys(period, length, now)
+                pipe.hincrby(counts_key, "total", 1)
+                pipe.hincrby(counts_key, f"bot:{bot_id}", 1)
+                pipe.hincrby(counts_key, f"site:{site_name}", 1)
+                pipe.expire(counts_key, length * 2)
+                pipe.pfadd(uniques_key, user_id)
+                pipe.expire(uniques_key, length * 2)
+
+            streak_keys = (
+                f"slbot-vote-streak-{bot_id}-{user_id}",
+                f"slbot-vote-streak-counted-{bot_id}-{user_id}",
+                f"slbot-vote-best-streaks-{bot_id}",
+            )
+            streak_args = (user_id, STREAK_WINDOW, TWELVE_HOURS)
+            pipe.evalsha(self.streak_sha, len(streak_keys), *streak_keys, *streak_args)
+
+            try:
+                results = await pipe.execute()
+            except NoScriptError:
+                # redis lost the script (ie it restarted) - everything else in
+                # the pipeline still went through, so only the streak is redone
+                self.streak_sha = await self.bot.redis.script_load(STREAK_SCRIPT)
+                return int(
+                    await self.bot.redis.evalsha(
+                        self.streak_sha, len(streak_keys), *streak_keys, *streak_args
+                    )
+                )
+
+        return int(results[-1])
+
+    @ipy.slash_command(
+        "votes",
+        description="Shows the people who have voted for Astrea's bots the most.",
+    )
+    @ipy.slash_option(
+        "bot",
+        "The bot to show the leaderboard for. Defaults to all of them.",
+        ipy.OptionType.STRING,
+        required=False,
+        choices=[
+            ipy.SlashCommandChoice(name, str(bot_id))
+            for bot_id, name in BOT_NAMES.items()
+        ],
+    )
+    @ipy.slash_option(
+        "amount",
+        "How many people to show. Defaults to 10.",
+        ipy.OptionType.INTEGER,
+        required=False,
+        min_value=1,
+        max_value=25,
+    )
+    async def votes(
+        self,
+        ctx: ipy.InteractionContext,
+        bot: typing.Optional[str] = None,
+        amount: int = 10,
     ):
+        key = f"slbot-vote-leaderboard-{bot}" if bot else "slbot-vote-leaderboard"
+        top = await self.bot.redis.zrevrange(key, 0, amount - 1, withscores=True)
+
+        if not top:
+            await ctx.send(embeds=utils.error_embed_generate("No one has voted yet!"))
+            return
+
+        leaderboard = "\n".join(
+            f"**{place}.** <@{user_id}> - {int(score)} vote{'s' if score != 1 else ''}"
+            for place, (user_id, score) in enumerate(top, start=1)
+        )
+        title = f"Top Voters for {BOT_NAMES[int(bot)]}" if bot else "Top Voters"
+        embed = ipy.Embed(title=title, description=leaderboard, color=self.bot.color)
+        await ctx.send(embeds=embed, allowed_mentions=ipy.AllowedMentions.none())
+
+    async def resolve_voter(
+        self, user_id: int
+    ) -> tuple[typing.Optional[ipy.Member], typing.Optional[str]]:
+        # the gateway cache never needs a rest call, so check it first
+        if member := self.bot.guild.get_member(user_id):
+            return member, f"{member.mention} (**{member.tag}**)"
+
+        if info := self.voter_cache.get(user_id):
+            return None, info.display
+
+        member = await self.bot.guild.fetch_member(user_id)
+        if member:
+            # not cached - the fetch puts them in the gateway cache anyway
+            return member, f"{member.mention} (**{member.tag}**)"
+
+        user = await self.bot.fetch_user(user_id)
+        display = f"{user.mention} (**{user.tag}**)" if user else None
+        self.voter_cache.set(user_id, VoterInfo(display))
+        return None, display
+
+    @ipy.listen("member_add")
+    async def invalidate_on_member_add(self, event: ipy.events.MemberAdd):
+        self.voter_cache.pop(int(event.member.id))
+
+    @prefixed.prefixed_command(aliases=["voter-cache"])
+    @ipy.check(ipy.is_owner())
+    async def voter_cache_info(self, ctx: prefixed.PrefixedContext):
+        await ctx.reply(
+            f"Cached voters: {len(self.voter_cache)}\n"
+            f"Hits: {self.voter_cache.hits} | Misses: {self.voter_cache.misses}"
+            f" ({self.voter_cache.hit_rate:.1%} hit rate)"
+        )
+
+    async def announce_vote(self, vote: VoteAnnouncement):
+        if self.announce_window <= 0:
+            await self.send_single_announcement(vote)
+            return
+
+        if (
+            not self.announce_task
+            and time.monotonic() - self.last_announce >= self.announce_window
+        ):
+            # nothing else is going on, so there's no reason to wait
+            self.last_announce = time.monotonic()
+            await self.send_single_announcement(vote)
+            return
+
+        # note that anything buffered here is lost if the bot restarts before the
+        # window ends - that's at most a few seconds of announcements, though
+        self.pending_announcements.append(vote)
+        if not self.announce_task:
+            self.announce_task = asyncio.create_task(self.flush_announcements())
+
+    async def flush_announcements(self):
         try:
-            got_role: bool = False
-
-            member = await self.bot.guild.fetch_member(user_id)
-            if member:
-                username = f"{member.mention} (**{member.tag}**)"
-                if not member.has_role(self.bot_vote_role):
-                    await member.add_role(self.bot_vote_role)
-                    got_role = True
-            else:
-                user = await self.bot.fetch_user(user_id)
-                if user:
-                    username = f"{user.mention} (**{user.tag}**)"
-
-            vote_content = (
-                f"{username} has voted for <@{bot_id}> on **{site_name}** - thank you"
-                " so much!"
+            # votes that come in while we're sending are picked up by the next
+            # round, as this task is still set and nothing else will send them
+            while self.pending_announcements:
+                delay = self.last_announce + self.announce_window - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+                votes = self.pending_announcements
+                self.pending_announcements = []
+                self.last_announce = time.monotonic()
+
+                try:
+                    if len(votes) == 1:
+                        await self.send_single_announcement(votes[0])
+                    else:
+                        await self.send_grouped_announcement(votes)
+                except Exception as e:
+                    await utils.error_handle(self.bot, e)
+                    try:
+                        # the votes were already acked, so put the announcements
+                        # back in the queue to be retried like any other job
+                        await self.requeue_announcements(votes)
+                    except Exception as requeue_error:
+                        await utils.error_handle(self.bot, requeue_error)
+        finally:
+            self.announce_task = None
+
+    async def requeue_announcements(self, votes: list[VoteAnnouncement]):
+        for vote in votes:
+            await self.vote_queue.enqueue(
+                {
+                    "announce_only": "1",
+                    "username": vote.username,
+                    "user_id": vote.user_id,
+                    "bot_id": vote.bot_id,
+                    "site_name": vote.site_name,
+                    "vote_url": vote.vote_url,
+                    "got_role": "1" if vote.got_role else "0",
+                }
             )
-            if got_role:
-                vote_content += (
-                    f"\n\nThey also got the <@&{self.bot_vote_role}> role for voting"
-                    " for the first time! Consider voting too if you want a cool role"
-                    " like that."
+
+    async def send_single_announcement(self, vote: VoteAnnouncement):
+        vote_content = (
+            f"{vote.username} has voted for <@{vote.bot_id}> on **{vote.site_name}**"
+            " - thank you so much!"
+        )
+        if vote.got_role:
+            vote_content += (
+                f"\n\nThey also got the <@&{self.bot_vote_role}> role for voting"
+                " for the first time! Consider voting too if you want a cool role"
+                " like that."
+            )
+
+        embed = ipy.Embed(
+            title="Vote Received", description=vote_content, color=self.bot.color
+        )
+        content = f"<@{vote.user_id}>" if vote.got_role else None
+
+        for embeds in utils.fit_embed_messages(
+            embed,
+            fields=[
+                (
+                    "Vote for this bot!",
+                    f"[Click here!]({vote.vote_url.format(bot_id=vote.bot_id)})",
                 )
+            ],
+        ):
+            await self.bot_vote_channel.send(content=content, embeds=embeds)
+            content = None
+
+    async def send_grouped_announcement(self, votes: list[VoteAnnouncement]):
+        lines = [
+            f"{vote.username} voted for <@{vote.bot_id}> on **{vote.site_name}**"
+            + (f" and got <@&{self.bot_vote_role}>!" if vote.got_role else "")
+            for vote in votes
+        ]
+
+        links: dict[str, None] = {}  # a dict to dedupe while keeping order
+        for vote in votes:
+            links[
+                f"<@{vote.bot_id}>: [Click"
+                f" here!]({vote.vote_url.format(bot_id=vote.bot_id)})"
+            ] = None
+
+        pages: list[list[str]] = [[]]
+        page_length = 0
+        for line in lines:
+            # leave plenty of room for the title and link field
+            if page_length + len(line) + 1 > 3500 and pages[-1]:
+                pages.append([])
+                page_length = 0
+            pages[-1].append(line)
+            page_length += len(line) + 1
+
+        pinged = [vote.user_id for vote in votes if vote.got_role]
+        ping_chunks = [
+            " ".join(f"<@{user_id}>" for user_id in pinged[i : i + PINGS_PER_MESSAGE])
+            for i in range(0, len(pinged), PINGS_PER_MESSAGE)
+        ]
+
+        for index, page in enumerate(pages):
+            title = f"{len(votes)} Votes Received - thank you so much!"
+            if len(pages) > 1:
+                title += f" ({index + 1}/{len(pages)})"
 
             embed = ipy.Embed(
-                title="Vote Received", description=vote_content, color=self.bot.color
+                title=title, description="\n".join(page), color=self.bot.color
             )
-            embed.add_field(
-                "Vote for this bot!", f"[Click here!]({vote_url.format(bot_id=bot_id)})"
+            fields = (
+                [("Vote for these bots!", "\n".join(links))]
+                if index == len(pages) - 1
+                else []
             )
-            content = f"<@{user_id}>" if got_role else None
 
-            await self.bot_vote_channel.send(content=content, embeds=embed)
-        except Exception as e:
-            await utils.error_handle(self.bot, e)
+            for embeds in utils.fit_embed_messages(embed, fields=fields):
+                content = ping_chunks.pop(0) if ping_chunks else None
+                await self.bot_vote_channel.send(content=content, embeds=embeds)
+
+        for content in ping_chunks:
+            await self.bot_vote_channel.send(content=content)
 
 
 def setup(bot: utils.SLBotBase) -> None:
-    importlib.reload(utils)
+    if not bot.init_load:
+        importlib.reload(utils)
     VoteHandling(bot)
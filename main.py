@@ -2,6 +2,7 @@ import asyncio
 import contextlib
 import logging
 import os
+import time
 
 import interactions as ipy
 import redis.asyncio as aioredis
@@ -9,6 +10,12 @@ from dotenv import load_dotenv
 from interactions.ext import prefixed_commands as prefixed
 from tortoise import Tortoise
 
+import common.error_digest as error_digest
+import common.ext_loader as ext_loader
+import common.log_utils as log_utils
+import common.mention_cache as mention_cache
+import common.owner_notify as owner_notify
+import common.role_queue as role_queue
 import common.utils as utils
 
 load_dotenv()
@@ -16,13 +23,9 @@ load_dotenv()
 
 logger = logging.getLogger("slbot")
 logger.setLevel(logging.INFO)
-handler = logging.FileHandler(
-    filename=os.environ["LOG_FILE_PATH"], encoding="utf-8", mode="a"
+log_listener = log_utils.setup_queued_logging(
+    logger, log_utils.file_handler(os.environ["LOG_FILE_PATH"])
 )
-handler.setFormatter(
-    logging.Formatter("%(asctime)s:%(levelname)s:%(name)s: %(message)s")
-)
-logger.addHandler(handler)
 
 
 class SLBot(utils.SLBotBase):
@@ -42,7 +45,9 @@ class SLBot(utils.SLBotBase):
             else f"Reconnected at {time_format}!"
         )
 
-        await self.owner.send(connect_msg)
+        # these can come in bursts if the connection is shaky, and they're
+        # merged together in the queue if so
+        self.owner_notifier.notify(connect_msg, self.owner_notifier.PRIORITY_STATUS)
 
         self.init_load = False
 
@@ -67,10 +72,29 @@ class SLBot(utils.SLBotBase):
         )
         await self.change_presence(activity=activity)
 
+    @ipy.listen("role_create")
+    async def on_role_create(self, event: ipy.events.RoleCreate):
+        self.mention_cache.role_changed(event.guild_id, event.role)
+
+    @ipy.listen("role_update")
+    async def on_role_update(self, event: ipy.events.RoleUpdate):
+        self.mention_cache.role_changed(event.guild_id, event.after)
+
+    @ipy.listen("role_delete")
+    async def on_role_delete(self, event: ipy.events.RoleDelete):
+        self.mention_cache.role_deleted(event.guild_id, event.id)
+
+    @ipy.listen("guild_left")
+    async def on_guild_left(self, event: ipy.events.GuildLeft):
+        self.mention_cache.forget_guild(event.guild_id)
+
     async def on_error(self, source: str, error: Exception, *args, **kwargs) -> None:
         await utils.error_handle(self, error)
 
     async def stop(self) -> None:
+        self.role_queue.stop()
+        self.error_digest.stop()
+        self.owner_notifier.stop()
         await Tortoise.close_connections()  # this will complain a bit, just ignore it
         return await super().stop()
 
@@ -105,15 +129,24 @@ async def start():
     )
     bot.redis = aioredis.from_url(os.environ["REDIS_URL"], decode_responses=True)
     bot.fully_ready = asyncio.Event()
-
+    bot.role_queue = role_queue.RoleMutationQueue(bot)
+    bot.owner_notifier = owner_notify.OwnerNotifier(bot)
+    bot.owner_notifier.start()
+    bot.error_digest = error_digest.ErrorDigest(bot)
+    bot.error_digest.start()
+    bot.mention_cache = mention_cache.MentionCache()
+
+    discovery_start = time.perf_counter()
     ext_list = utils.get_all_extensions(os.environ["DIRECTORY_OF_FILE"])
-    for ext in ext_list:
-        try:
-            bot.load_extension(ext)
-        except ipy.errors.ExtensionLoadException:
-            raise
+    bot.startup_report = ext_loader.load_extensions(
+        bot, ext_list, discovery_time=time.perf_counter() - discovery_start
+    )
 
     await bot.astart(os.environ["MAIN_TOKEN"])
 
 
-asyncio.run(start())
+try:
+    asyncio.run(start())
+finally:
+    # flushes anything still waiting to be written
+    log_listener.stop()
@@ -0,0 +1,23 @@
+-- Creates the indexes declared on PremiumCode and GuildConfig in common/models.py.
+--
+-- Nothing in the bot runs generate_schemas or migrations against the production
+-- database, so these have to be created by hand. CONCURRENTLY avoids locking the
+-- tables while the indexes are built, but can't run inside of a transaction -
+-- run this file with plain psql, ie:
+--
+--     psql "$DB_URL" -f scripts/create_indexes.sql
+--
+-- The names match the ones Tortoise would generate, so generate_schemas(safe=True)
+-- will leave them alone. Keep this in sync with the Meta.indexes in common/models.py.
+
+-- lookups by user always filter on whether the code is paid for or not
+CREATE INDEX CONCURRENTLY IF NOT EXISTS "idx_realmpremiu_user_id_a239a4"
+    ON "realmpremiumcode" ("user_id", "customer_id");
+
+-- paid codes only, for PremiumMembershipIndex
+CREATE INDEX CONCURRENTLY IF NOT EXISTS "idx_realmpremiumcode_paid_user_id"
+    ON "realmpremiumcode" ("user_id") WHERE customer_id IS NOT NULL;
+
+-- revoking codes finds the guild configs using them
+CREATE INDEX CONCURRENTLY IF NOT EXISTS "idx_realmguildc_premium_c67cfc"
+    ON "realmguildconfig" ("premium_code_id");